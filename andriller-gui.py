@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
+import multiprocessing
 import andriller
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # the decoding workers are spawned, also from a frozen build
     andriller.run()
@@ -37,6 +37,11 @@ def run():
         "-v", "--version", dest="version", action="store_true", help="Show the version."
     )
     parser.set_defaults(debug=False, file=None, version=None)
+    from . import cli, jobs
+
+    subparsers = parser.add_subparsers(dest="command")
+    cli.add_parser(subparsers)
+    jobs.add_parser(subparsers)
     args = parser.parse_args()
     # Set logging level
     level = logging.DEBUG if args.debug else logging.INFO
@@ -52,6 +57,20 @@ def run():
     if args.file:
         logging.basicConfig(filename=args.file, filemode="a", level=level)
 
+    # Headless extraction
+    if args.command == "extract":
+        import sys
+
+        logging.basicConfig(stream=sys.stderr, level=level)
+        sys.exit(cli.main(args))
+
+    # Job queue
+    if args.command == "jobs":
+        import sys
+
+        logging.basicConfig(stream=sys.stderr, level=level)
+        sys.exit(jobs.main(args))
+
     # No thread
     if args.nothread:
         os.environ["NOTHREAD"] = "1"
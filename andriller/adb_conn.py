@@ -2,14 +2,12 @@ import re
 import sys
 import shlex
 import atexit
+import hashlib
 import os.path
 import logging
+import threading
 import subprocess
-from typing import List, Union
-if sys.platform == 'win32':
-    from .utils import placebo as timeout
-else:
-    from wrapt_timeout_decorator import timeout
+from typing import List, Tuple, Union
 from .config import CODEPATH  # noqa
 
 
@@ -20,6 +18,7 @@ class ADBConn:
     For Mac/Linux, install binaries via brew/apt/pacman.
     """
     UNIX = ['linux', 'linux2', 'darwin']
+    TIMEOUT = 60 * 60 * 2
     MODES = {
         'download': 'download',
         'bootloader': 'bootloader',
@@ -32,15 +31,17 @@ class ADBConn:
         """
         logger: optional, pass a dedicated loggger instance, else default will be used.
         log_level: optional, logging level.
+        serial: optional, bind all commands to a device serial (`adb -s <serial>`).
         """
+        self.serial = kwargs.get('serial')
         self.startupinfo = None
         self.adb_bin = None
         self.is_unix = sys.platform in self.UNIX
         self.rmr = b'\r\n'
         self._run_opt = None
+        self._is_adb_out_post_v5 = False
         self.setup_logging(**kwargs)
         self.setup()
-        self._is_adb_out_post_v5 = False
         atexit.register(self.kill)
 
     def setup_logging(self, logger=None, log_level=logging.INFO, **kwargs):
@@ -79,8 +80,7 @@ class ADBConn:
             self._run_opt = opt
         return self._run_opt
 
-    @timeout(60 * 60 * 2, use_signals=False)
-    def adb(self, cmd, binary=False, su=False, _for_out=False, **kwargs) -> Union[str, bytes]:
+    def adb(self, cmd, binary=False, su=False, _for_out=False, timeout=TIMEOUT, **kwargs) -> Union[str, bytes]:
         """
         Runs an adb command and returns the output.
 
@@ -88,14 +88,22 @@ class ADBConn:
             cmd (str): adb command.
             binary (bool): returns bytes output instead of str.
             su (bool): use superuser if the target device has it.
+            timeout (int): seconds before the command is killed and TimeoutError is raised.
 
         Example:
             to run `adb pull /path/myfile.txt` do: self.adb('shell id')
         """
         cmd = self._get_adb_cmd(cmd, su, _for_out, **kwargs)
-        run = subprocess.run([self.adb_bin, *cmd], **self.run_opt)
+        run = self._run([self.adb_bin, *cmd], timeout)
         return self._return_run_output(run, binary)
 
+    def _run(self, cmd: List[str], timeout) -> subprocess.CompletedProcess:
+        try:
+            return subprocess.run(cmd, timeout=timeout, **self.run_opt)
+        except subprocess.TimeoutExpired as err:
+            self.logger.debug(f'Timed out ({timeout}s): {cmd}')
+            raise TimeoutError(str(err)) from err
+
     def adb_out(self, cmd, binary=False, su=False, **kwargs) -> Union[str, bytes]:
         """
         Uses adb to retrieve the output from remote device.
@@ -110,13 +118,15 @@ class ADBConn:
         """
         return self.adb(cmd, binary=binary, su=su, _for_out=True, **kwargs)
 
-    def _get_adb_cmd(self, cmd, su, _for_out, **kwargs) -> List[str]:
+    def _get_adb_cmd(self, cmd, su, _for_out, _bind=True, **kwargs) -> List[str]:
         if isinstance(cmd, str):
             cmd = self.split_cmd(cmd)
         if su:
             cmd.insert(0, 'su -c')
         if _for_out:
             cmd.insert(0, 'exec-out' if self._is_adb_out_post_v5 else 'shell')
+        if self.serial and _bind:
+            cmd[0:0] = ['-s', self.serial]
         self.logger.debug(f'ADB cmd: {cmd}')
         return cmd
 
@@ -148,6 +158,11 @@ class ADBConn:
         return rc
 
     def device(self):
+        if self.serial:
+            for dev in self.devices():
+                if dev[0] == self.serial:
+                    return dev
+            return [None, None]
         dev = self.adb('devices', timeout=5)
         if dev:
             dev = dev.split('\n')
@@ -158,6 +173,16 @@ class ADBConn:
             self.logger.error('ADB binary cannot be used to check for connected devices!')
         return [None, None]
 
+    def devices(self) -> List[List[str]]:
+        """
+        Returns a list of all connected devices, as [serial, status] pairs.
+        """
+        dev = self.adb('devices', timeout=5, _bind=False)
+        if not dev:
+            self.logger.error('ADB binary cannot be used to check for connected devices!')
+            return []
+        return [line.split('\t')[:2] for line in dev.split('\n')[1:] if '\t' in line]
+
     def start(self):
         self.adb('start-server', timeout=10)
 
@@ -187,6 +212,80 @@ class ADBConn:
         data = self.adb_out(f'cat {file_path_strict}', binary=True, **kwargs)
         return data
 
+    def get_file_to(self, file_path, dst_path, su=False, algo='md5', buffer=2 ** 20, timeout=TIMEOUT,
+                    **kwargs) -> Tuple[int, str]:
+        """
+        Streams binary content of a remote file into a local file, without
+        holding the whole file in memory. Returns the number of bytes written
+        and the file hash, or (0, None) if adb exited with an error.
+
+        Args:
+            file_path (str|Path): Remote file path.
+            dst_path (str|Path): Local file path where to save.
+            su (bool): use superuser if the target device has it.
+            algo (str): hashing algorithm name.
+            buffer (int): read chunk size.
+            timeout (int): seconds before the transfer is killed and TimeoutError is raised.
+        """
+        file_path_strict = self.strict_name(file_path)
+        cmd = self._get_adb_cmd(f'cat {file_path_strict}', su, True, **kwargs)
+        hasher = hashlib.new(algo)
+        size = 0
+        expired = threading.Event()
+        with open(dst_path, 'wb') as W:
+            process = subprocess.Popen(
+                [self.adb_bin, *cmd],
+                shell=False,
+                startupinfo=self.startupinfo,
+                stdout=subprocess.PIPE)
+
+            def expire():
+                expired.set()
+                process.kill()
+
+            deadline = threading.Timer(timeout, expire)
+            deadline.start()
+            try:
+                for chunk in self.iter_unstrip(iter(lambda: process.stdout.read(buffer), b'')):
+                    W.write(chunk)
+                    hasher.update(chunk)
+                    size += len(chunk)
+                process.wait()
+            finally:
+                deadline.cancel()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+        if expired.is_set():
+            self.logger.debug(f'Timed out ({timeout}s): {cmd}')
+            raise TimeoutError(f'Transfer of {file_path} timed out after {timeout} seconds')
+        if process.returncode:
+            self.logger.warning(f'Transfer of {file_path} failed (adb exit code {process.returncode})')
+            return 0, None
+        return size, hasher.hexdigest()
+
+    def iter_unstrip(self, chunks):
+        """
+        Undoes CRLF translation (of pre-v5 adb) over a stream of byte chunks,
+        line endings split across chunk boundaries are carried over.
+        """
+        if self._is_adb_out_post_v5:
+            yield from chunks
+            return
+        carry = b''
+        for chunk in chunks:
+            data = (carry + chunk).replace(self.rmr, b'\n')
+            carry = b''
+            for n in range(len(self.rmr) - 1, 0, -1):
+                if data.endswith(self.rmr[:n]):
+                    data, carry = data[:-n], data[-n:]
+                    break
+            if data:
+                yield data
+        if carry:
+            yield carry
+
     def pull_file(self, file_path, dst_path, **kwargs):
         """
         Uses pull command to copy a file.
@@ -219,10 +318,36 @@ class ADBConn:
         self.logger.debug(f'Size Error for: {file_path}')
         return -1
 
-    @timeout(30, use_signals=False)
-    def cmd_shell(self, cmd: str, code: bool = False, **kwargs):
+    def get_mtime(self, file_path, **kwargs) -> Union[int, None]:
+        """
+        Returns remote file modification time (unix epoch), or None if not available.
+
+        Args:
+            file_path (str|Path): Remote file path.
+        """
+        file_path_strict = self.strict_name(file_path)
+        mtime = self.adb_out(f'stat -c %Y {file_path_strict}', **kwargs)
+        if mtime and mtime.isdigit():
+            return int(mtime)
+
+    def get_hash(self, file_path, algo='md5', **kwargs) -> Union[str, None]:
+        """
+        Returns remote file hash (using `md5sum`/`sha1sum` on the device), or None if not available.
+
+        Args:
+            file_path (str|Path): Remote file path.
+            algo (str): md5|sha1
+        """
+        file_path_strict = self.strict_name(file_path)
+        digest = self.adb_out(f'{algo}sum {file_path_strict}', **kwargs)
+        if digest:
+            digest = digest.split()[0].lower()
+            if re.match(r'^[0-9a-f]{32,40}$', digest):
+                return digest
+
+    def cmd_shell(self, cmd: str, code: bool = False, timeout=30, **kwargs):
         self.logger.debug(f'Shell cmd: {cmd}')
-        run = subprocess.run(self.split_cmd(cmd), **self.run_opt)
+        run = self._run(self.split_cmd(cmd), timeout)
         if code:
             return run.returncode
         else:
@@ -233,8 +358,8 @@ class ADBConn:
         return self.cmd_shell('which adb') or None
 
     def _adb_has_exec(self) -> bool:
-        cmd = f'{self.adb_bin} exec-out id'
-        return self.cmd_shell(cmd, code=True) == 0
+        cmd = self._get_adb_cmd('exec-out id', False, False)  # bound to the serial, if several devices are connected
+        return self._run([self.adb_bin, *cmd], 30).returncode == 0
 
     def split_cmd(self, cmd: str) -> list:
         if self.is_unix:
@@ -0,0 +1,163 @@
+import os
+import gzip
+import zlib
+import pickle
+import itertools
+import hashlib
+import logging
+import tempfile
+from contextlib import suppress
+from appdirs import AppDirs
+from . import utils
+from . import __version__, __package_name__
+
+logger = logging.getLogger(__name__)
+
+
+class DecodeCache:
+    """
+    Persistent cache of decoded `DATA` rows, so unchanged databases are not decoded again.
+    Entries are keyed by the decoder (class and version), hashes of the input file, its sidecars
+    and extras, and the time settings. Entries are evicted least recently used first, by total size.
+    Rows of `streamed` decoders are saved batch by batch as the first report reads them (see `iter_rows`).
+    """
+    SIDECARS = ['-wal', '-journal']
+    EXTS = ('.pickle.z', '.rows.gz')  # `DATA` entries, streamed rows entries
+
+    def __init__(self, cache_dir=None, max_size=2 ** 30):
+        """
+        cache_dir (str): optional, defaults to the user's cache directory.
+        max_size (int): maximum total size of the cache in bytes.
+        """
+        self.cache_dir = cache_dir or os.path.join(AppDirs(appname=__package_name__).user_cache_dir, 'decoded')
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, deco) -> str:
+        """
+        Returns the cache key for a (staged) decoder instance with its `input_file`.
+        """
+        deco_class = type(deco)
+        parts = [
+            f'{deco_class.__module__}.{deco_class.__qualname__}',
+            str(getattr(deco_class, 'version', 0)),
+            __version__,
+            utils.get_hash(deco.input_file, algo='sha256'),
+        ]
+        for suffix in self.SIDECARS:
+            sidecar = f'{deco.input_file}{suffix}'
+            parts.append(utils.get_hash(sidecar, algo='sha256') if os.path.isfile(sidecar) else '')
+        for extra in deco.EXTRAS:
+            neighbour = deco.get_neighbour(extra.TARGET)
+            parts.append(utils.get_hash(neighbour, algo='sha256') if neighbour else '')
+        parts.extend([str(deco.conf.tzone), deco.conf.date_format])
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    def entry(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pickle.z')
+
+    def rows_entry(self, key):
+        return os.path.join(self.cache_dir, f'{key}.rows.gz')
+
+    def get(self, key):
+        """
+        Returns cached rows or None, a hit marks the entry as recently used.
+        """
+        entry = self.entry(key)
+        try:
+            with open(entry, 'rb') as R:
+                data = pickle.loads(zlib.decompress(R.read()))
+            os.utime(entry)
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logger.debug(f'Cache entry is not readable: {entry} > {err}')
+            return None
+
+    def put(self, key, data):
+        try:
+            payload = zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception as err:
+            logger.debug(f'Decoded data cannot be cached: {err}')
+            return False
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as W:
+            W.write(payload)
+        os.replace(W.name, self.entry(key))
+        self.evict()
+        return True
+
+    def get_total(self, key):
+        """
+        Returns the number of cached streamed rows or None, a hit marks the entry as recently used.
+        """
+        entry = self.rows_entry(key)
+        try:
+            with gzip.open(entry, 'rb') as R:
+                total = pickle.load(R)
+            os.utime(entry)
+            return total
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logger.debug(f'Cache entry is not readable: {entry} > {err}')
+            return None
+
+    def iter_rows(self, key, source, total, batch_size=1000):
+        """
+        Yields the streamed rows cached under `key`; on a miss, yields the rows of `source()`
+        and saves them batch by batch (the entry is kept once all the rows were read).
+        """
+        try:
+            R = gzip.open(self.rows_entry(key), 'rb')
+        except FileNotFoundError:
+            yield from self.save_rows(key, source(), total, batch_size)
+            return
+        with R:
+            pickle.load(R)  # total
+            while True:
+                try:
+                    batch = pickle.load(R)
+                except EOFError:
+                    return
+                yield from batch
+
+    def save_rows(self, key, rows, total, batch_size=1000):
+        """
+        Yields `rows`, written to a temporary file that replaces the entry when all were yielded.
+        """
+        fd, path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        saving = True
+        try:
+            with open(fd, 'wb') as F, gzip.GzipFile(fileobj=F, mode='wb', compresslevel=6) as W:
+                pickle.dump(total, W, protocol=pickle.HIGHEST_PROTOCOL)
+                for batch in iter(lambda: [*itertools.islice(rows, batch_size)], []):
+                    if saving:
+                        try:
+                            pickle.dump(batch, W, protocol=pickle.HIGHEST_PROTOCOL)
+                        except Exception as err:
+                            logger.debug(f'Decoded rows cannot be cached: {err}')
+                            saving = False
+                    yield from batch
+            if saving:
+                os.replace(path, self.rows_entry(key))
+                self.evict()
+        finally:
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(self.EXTS):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -1,31 +1,52 @@
 import os
 import re
+import sys
+import time
 import base64
 import logging
 import pathlib
 import sqlite3
 import datetime
 import functools
+import itertools
 import xml.etree.ElementTree
 from contextlib import suppress
 from . import config
 from . import engines
+from . import wal
 from .config import SQLITE_MAGIC
 
 logger = logging.getLogger(__name__)
 
 
-def sqlite_error_retry(method):
-    @functools.wraps(method)
-    def decorator(*args, **kwargs):
-        try:
-            return method(*args, **kwargs)
-        except sqlite3.OperationalError as err:
-            if 'UTF-8' in str(err):
-                return method(*args, **kwargs,
-                    cursor_kw={'text_factory': AndroidDecoder.decode_safe})
-            raise err
-    return decorator
+@functools.lru_cache(maxsize=None)
+def unix_time_format(tzone, date_format: str):
+    """
+    Returns (offset seconds, format) for `time.strftime`, with the fixed time zone fields filled in.
+    """
+    offset = tzone.utcoffset(None)
+    sign, hhmm = '-' if offset < datetime.timedelta(0) else '+', abs(offset)
+    fields = {
+        'Z': tzone.tzname(None),
+        'z': f'{sign}{hhmm.seconds // 3600:02}{hhmm.seconds // 60 % 60:02}',
+        'f': '000000',
+        '%': '%%',
+    }
+    fmt = re.sub(r'%([Zzf%])', lambda m: fields[m.group(1)], date_format)
+    return int(offset.total_seconds()), fmt
+
+
+@functools.lru_cache(maxsize=2 ** 16)
+def format_unix(unix_stamp: int, tzone, date_format: str) -> str:
+    offset, fmt = unix_time_format(tzone, date_format)
+    return time.strftime(fmt, time.gmtime(unix_stamp + offset))
+
+
+@functools.lru_cache(maxsize=2 ** 16)
+def format_webkit(webkit_stamp: int, tzone, date_format: str) -> str:
+    epoch = datetime.datetime(1601, 1, 1, tzinfo=tzone)
+    d = datetime.timedelta(microseconds=webkit_stamp)
+    return (epoch + d).strftime(date_format)
 
 
 class AndroidDecoder:
@@ -48,7 +69,19 @@ class AndroidDecoder:
     target_is_db = None
     title = None
     template_name = None  # HTML template
+    version = 1  # bump when the decoded output changes (invalidates cached results)
     headers = {}  # {<key for XLSX>: <Title name for HTML>}
+    streamed = False  # rows are yielded by `iter_data()` when the reports are written, instead of kept in `DATA`
+    rows_cache = None  # (DecodeCache, key) which keeps the rows of a `streamed` decoder
+    batch_size = 1000  # rows fetched at a time by `sql_table_iter`
+    resume_fetch = sys.version_info >= (3, 11)  # a row failing to convert is read again by the next fetch
+    wal_image_max = 2 ** 26  # larger databases are opened from the file, without their WAL (logged)
+    PRAGMAS = {  # applied once to the read-only connection
+        'query_only': 1,
+        'mmap_size': 2 ** 28,
+        'cache_size': -2 ** 15,  # KiB
+        'temp_store': 'MEMORY',
+    }
 
     def __init__(self, work_dir, input_file, stage=False, **kwargs):
         """
@@ -65,21 +98,58 @@ class AndroidDecoder:
             self.logger.debug(f'work_dir:{work_dir}')
             self.logger.debug(f'input_file:{input_file}')
             self.DATA = []  # main storage for decoded data
-            self.main()
+            with self:
+                self.main()
 
     @property
     def conf(self):
         if not hasattr(self, '_conf'):
-            self._conf = config.Config()
+            self._conf = config.get_config()
         return self._conf
 
     def main(self):
         """
         Make the magic happen here
         populate `self.DATA` list with decoded objects
+        (`streamed` decoders only set `self.row_count`, their rows come from `iter_data()`)
         """
         pass
 
+    def iter_data(self):
+        """
+        Yields the decoded rows one at a time, for `streamed` decoders.
+        """
+        yield from self.DATA
+
+    def rows(self):
+        """
+        Rows for the reports: a generator for `streamed` decoders, otherwise `DATA`.
+        With a `rows_cache`, streamed rows are read from the cache, or saved to it as they are yielded.
+        """
+        if not self.streamed:
+            return self.DATA
+        if self.rows_cache:
+            cache, key = self.rows_cache
+            return cache.iter_rows(key, self.iter_decoded, self.total, batch_size=self.batch_size)
+        return self.iter_data()
+
+    def iter_decoded(self):
+        """
+        `iter_data()`, running `main()` first if the decoder was only staged (its rows were cached, then evicted).
+        """
+        if not hasattr(self, 'DATA'):
+            self.DATA = []
+            with self:
+                self.main()
+        yield from self.iter_data()
+
+    @property
+    def total(self) -> int:
+        """
+        Number of decoded rows.
+        """
+        return self.row_count if self.streamed else len(self.DATA)
+
     @property
     def target_path_ab(self):
         return self.gen_target_path(self, is_ab=True)
@@ -116,11 +186,19 @@ class AndroidDecoder:
         return [path_property]
 
     def get_neighbour(self, neighbour, **kwargs):
+        """
+        Finds a file next to the input file, or in a sibling namespace directory
+        (eg: `shared_prefs` next to `databases`), as extractions may keep the app structure.
+        """
         input_dir = os.path.dirname(self.input_file)
-        if neighbour in os.listdir(input_dir):
-            neighbour = os.path.join(input_dir, neighbour)
-            if os.path.isfile(neighbour):
-                return neighbour
+        app_dir = os.path.dirname(input_dir)
+        siblings = []
+        with suppress(OSError):
+            siblings = sorted(os.path.join(app_dir, d) for d in os.listdir(app_dir))
+        for search_dir in [input_dir, *siblings]:
+            file_path = os.path.join(search_dir, neighbour)
+            if os.path.isfile(file_path):
+                return file_path
         return False
 
     def add_extra(self, namespace, target):
@@ -128,7 +206,13 @@ class AndroidDecoder:
             TARGET = target
             NAMESPACE = namespace
             PACKAGE = self.PACKAGE
-        self.EXTRAS.append(Extra)
+        self.EXTRAS = [*self.EXTRAS, Extra]  # per instance, not the shared class list
+
+    def __getstate__(self):
+        # Extras are local classes, which cannot be pickled (eg: results returned by a worker process)
+        state = dict(self.__dict__)
+        state.pop('EXTRAS', None)
+        return state
 
     def get_extras(self, **kwargs):
         return [self.gen_target_path(xtr, **kwargs) for xtr in self.EXTRAS]
@@ -162,13 +246,43 @@ class AndroidDecoder:
     def zipper(row: sqlite3.Row):
         return dict(zip(row.keys(), row))
 
+    def connect(self):
+        """
+        Returns the read-only connection to `input_file`, opened once and shared by all query helpers.
+        It is closed by `close()`, or when leaving the decoder's context.
+        If there is a `-wal` file, its committed frames are applied to an in-memory image of the database.
+        Otherwise the file is opened as immutable, so SQLite never creates a `-shm` (or `-wal`) next to it.
+        """
+        if getattr(self, '_conn', None) is None:
+            uri, conn = self.sqlite_readonly, None
+            if os.path.getsize(self.input_file) <= self.wal_image_max:
+                conn = wal.connect(self.input_file, cached_statements=256)
+            elif os.path.isfile(f'{self.input_file}-wal') and os.path.getsize(f'{self.input_file}-wal'):
+                self.logger.warning(f'WAL not applied, database over {self.wal_image_max} bytes: {self.input_file}')
+            if conn is None:
+                conn = sqlite3.connect(f'{uri}&immutable=1', uri=True, cached_statements=256)
+            for pragma, value in self.PRAGMAS.items():
+                conn.execute(f'PRAGMA {pragma}={value}')
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        conn, self._conn = getattr(self, '_conn', None), None
+        if conn is not None:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def get_cursor(self, row_factory=None, text_factory=None):
-        with sqlite3.connect(self.sqlite_readonly, uri=True) as conn:
-            if row_factory:
-                conn.row_factory = row_factory
-            if text_factory:
-                conn.text_factory = text_factory
-            return conn.cursor()
+        conn = self.connect()
+        conn.text_factory = text_factory or str
+        cur = conn.cursor()
+        cur.row_factory = row_factory
+        return cur
 
     def get_sql_tables(self, cursor_kw={}):
         cur = self.get_cursor(**cursor_kw)
@@ -178,30 +292,100 @@ class AndroidDecoder:
         cur = self.get_cursor(**cursor_kw)
         return tuple(x[1] for x in cur.execute(f"PRAGMA table_info({table_name})"))
 
-    @sqlite_error_retry
-    def sql_table_as_dict(self, table, columns='*', order_by=None, order="DESC", where={}, cursor_kw={}):
-        cur = self.get_cursor(row_factory=sqlite3.Row, **cursor_kw)
-        # table_names = tuple(x[1] for x in c.execute(f"PRAGMA table_info({table})"))
-        # if (order_by is not None) and (order_by not in table_names):
-        #     raise NameError(f"Column `{order_by}` is not in `{table}` table")
+    def sql_table_iter(self, table, columns='*', order_by=None, order="DESC", where={}, cursor_kw={}, joins=()):
+        """
+        Yields table rows as dicts, fetched `batch_size` rows at a time (instead of building the full list).
+        columns (list): column names or expressions, eg: 'messages.*', 'chats.subject AS chat'
+        joins (list): JOIN clauses, eg: 'LEFT JOIN chat_list AS chats ON chats.jid = messages.jid'
+        """
+        query, params = self.build_query(table, columns, where, joins=joins, order_by=order_by, order=order)
+        yield from map(self.zipper, self.iter_rows(query, params, cursor_kw={'row_factory': sqlite3.Row, **cursor_kw}))
+
+    def sql_table_as_dict(self, table, columns='*', order_by=None, order="DESC", where={}, cursor_kw={}, joins=()):
+        return [*self.sql_table_iter(table, columns, order_by, order, where, cursor_kw, joins)]
+
+    def sql_table_count(self, table, where={}, joins=()):
+        query, params = self.build_query(table, ['count(*)'], where, joins=joins)
+        return self.get_cursor().execute(query, params).fetchone()[0]
+
+    def sql_table_rows(self, table, columns='*', where={}, cursor_kw={}, group_by=None):
+        query, params = self.build_query(table, columns, where, group_by=group_by)
+        return [*self.iter_rows(query, params, cursor_kw)]
+
+    def iter_rows(self, query, params=(), cursor_kw={}):
+        """
+        Yields the rows of a query, fetched `batch_size` rows at a time. Text is decoded as strict UTF-8;
+        if a value is not valid UTF-8, text is decoded by `decode_lenient` from that row on, on the same
+        cursor (the failed row is read again by the next fetch), so the statement runs only once.
+        Before Python 3.11 a failed row ends the statement, so text is decoded by `decode_lenient` from the start.
+        The connection is shared, so its text factory is set again before every fetch, in case
+        another query ran in between with a different one.
+        """
+        cursor_kw, strict = dict(cursor_kw), 'text_factory' in cursor_kw
+        if not strict and not self.resume_fetch:
+            cursor_kw['text_factory'] = self.decode_lenient
+        cur = self.get_cursor(**cursor_kw)
+        text_factory = cur.connection.text_factory
+        cur.execute(query, params)
+        while True:
+            cur.connection.text_factory = text_factory
+            rows = []
+            try:
+                for row in itertools.islice(cur, self.batch_size):
+                    rows.append(row)
+            except sqlite3.OperationalError as err:
+                if 'UTF-8' not in str(err) or strict:
+                    raise err
+                self.logger.debug(f'Lenient text decoding from this row on: {err}')
+                text_factory = self.decode_lenient
+            else:
+                if not rows:
+                    return
+            yield from rows
+
+    def build_query(self, table, columns='*', where={}, joins=(), group_by=None, order_by=None, order="DESC"):
+        """
+        Returns (query, params), where values are bound parameters, so the same query text is
+        reused from the connection's statement cache for any values.
+        """
         query = f"SELECT {','.join(columns)} FROM {table}"
+        for join in joins:
+            query += f' {join}'
+        params = []
         if where:
-            query += f' WHERE {self.where(where)}'
+            clause, params = self.where_params(where)
+            query += f' WHERE {clause}'
+        if group_by:
+            query += f' GROUP BY {group_by}'
         if order_by:
             query += f" ORDER BY {order_by} {order}"
-        self.logger.debug(f"SQL> {query}")
-        return [*map(self.zipper, cur.execute(query))]
+        self.logger.debug(f"SQL> {query} {params}")
+        return query, params
 
-    def sql_table_rows(self, table, columns='*', where={}, cursor_kw={}):
-        cur = self.get_cursor(**cursor_kw)
-        query = f"SELECT {','.join(columns)} FROM {table}"
-        if where:
-            query += f' WHERE {self.where(where)}'
-        self.logger.debug(f"SQL> {query}")
-        return cur.execute(query).fetchall()
+    @staticmethod
+    def where_params(params: dict):
+        """
+        Same conditions as `where()`, returned as (clause, values) with placeholders; eg:
+        {'!status': [6, -1], 'type': 1} > ("status NOT IN (?,?) AND type=?", ['6', '-1', '1'])
+        Values are bound as text, as they were compared in the quoted clauses.
+        """
+        where_all, values = [], []
+        for key, vals in params.items():
+            op = '='
+            if key.startswith('!'):
+                key, op = key[1:], '!='
+            if isinstance(vals, (list, set, tuple)):
+                in_op = 'NOT IN' if op == '!=' else 'IN'
+                where_all.append(f"{key} {in_op} ({','.join('?' * len(vals))})")
+                values.extend(map(str, vals))
+            else:
+                where_all.append(f'{key}{op}?')
+                values.append(str(vals))
+        return ' AND '.join(where_all), values
 
     @staticmethod
     def where(params: dict):
+        # Literal (quoted) form of the conditions, queries use `where_params`
         where_all = []
         keyval = lambda k, v: f"{k}='{v}'"  # noqa: E731
         for key, vals in params.items():
@@ -223,28 +407,38 @@ class AndroidDecoder:
         }
 
     def report_html(self):
+        """
+        Renders the HTML report, streamed to the file (the whole document is not built in memory).
+        """
         env = engines.get_engine()
         template = env.get_template(self.template_name)
-        report_file = os.path.join(self.work_dir, f'{self.title}.html')
+        file_name = re.sub(r'[\\/:*?"<>|]', '_', self.title)  # titles may carry an input path
+        report_file = os.path.join(self.work_dir, f'{file_name}.html')
         with open(report_file, 'w', encoding='UTF-8') as W:
-            W.write(template.render(
-                DATA=self.DATA,
+            W.writelines(template.generate(
+                DATA=self.rows(),
+                total=self.total,
                 title=self.title,
                 headers=self.headers.values(),
                 **self.get_head_foot()))
         return os.path.relpath(report_file, self.work_dir)
 
-    def report_xlsx(self, workbook=None, to_close=False):
+    def report_xlsx(self, workbook=None, to_close=False, rows=None):
+        """
+        Writes the rows to a sheet (or several, past the sheet row limit), one row at a time.
+        rows (iterable): optional, rows to write instead of `self.rows()` (eg: a generator).
+        """
         if not workbook:
             to_close = True
             workbook = engines.Workbook(self.work_dir, self.title)
-        sheet = workbook.add_sheet(self.title)
         col_vals, col_names = zip(*self.headers.items())
-        workbook.write_header(sheet, col_names)
-        for row, data in enumerate(self.DATA, start=1):
-            data['_id'] = data.get('_id', row)
-            row_vals = (data.get(k) for k in col_vals)
-            sheet.write_row(row, 0, row_vals)
+
+        def row_vals():
+            for row, data in enumerate(self.rows() if rows is None else rows, start=1):
+                data['_id'] = data.get('_id', row)
+                yield [data.get(k) for k in col_vals]
+
+        workbook.write_rows(self.title, col_names, row_vals())
         if to_close:
             workbook.close()
             return os.path.relpath(workbook.file_path, self.work_dir)
@@ -255,19 +449,42 @@ class AndroidDecoder:
 
     def unix_to_time(self, unix_stamp: int) -> str:
         if int(unix_stamp) > 0:
-            d = datetime.datetime.fromtimestamp(int(unix_stamp), self.conf.tzone)
-            return d.strftime(self.conf.date_format)
+            return format_unix(int(unix_stamp), self.conf.tzone, self.conf.date_format)
 
     def unix_to_time_ms(self, unix_stamp: int) -> str:
         if int(unix_stamp) > 0:
-            d = datetime.datetime.fromtimestamp(int(unix_stamp) // 1000, self.conf.tzone)
-            return d.strftime(self.conf.date_format)
+            return format_unix(int(unix_stamp) // 1000, self.conf.tzone, self.conf.date_format)
 
     def webkit_to_time(self, webkit_stamp: int) -> str:
         if int(webkit_stamp) > 0:
-            epoch = datetime.datetime(1601, 1, 1, tzinfo=self.conf.tzone)
-            d = datetime.timedelta(microseconds=int(webkit_stamp))
-            return (epoch + d).strftime(self.conf.date_format)
+            return format_webkit(int(webkit_stamp), self.conf.tzone, self.conf.date_format)
+
+    def time_converter(self, unit='ms'):
+        """
+        Returns a function converting timestamps to strings, with the time settings looked up once.
+        unit (str): s|ms|webkit
+        """
+        tzone, date_format = self.conf.tzone, self.conf.date_format
+        formatter, divisor = {
+            's': (format_unix, 1),
+            'ms': (format_unix, 1000),
+            'webkit': (format_webkit, 1),
+        }[unit]
+
+        def convert(stamp):
+            if stamp and int(stamp) > 0:
+                return formatter(int(stamp) // divisor, tzone, date_format)
+        return convert
+
+    def time_column(self, rows, column, unit='ms', target=None):
+        """
+        Converts a column of timestamps in all rows (dicts) at once, in place.
+        target (str): optional, key for the converted values (defaults to `column`).
+        """
+        convert = self.time_converter(unit)
+        for row in rows:
+            row[target or column] = convert(row[column])
+        return rows
 
     @staticmethod
     def to_chars(data) -> str:
@@ -284,6 +501,13 @@ class AndroidDecoder:
     def decode_safe(data: bytes) -> str:
         return data.decode('utf-8', errors='ignore')
 
+    @classmethod
+    def decode_lenient(cls, data: bytes) -> str:
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return cls.decode_safe(data)
+
     @classmethod
     def safe_str(cls, value):
         if isinstance(value, (str, float, int)):
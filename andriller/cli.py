@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import logging
+from . import driller
+from .cache import DecodeCache
+
+logger = logging.getLogger(__name__)
+
+
+class JsonProgress:
+    """
+    Status updater for `ChainExecution`, prints progress as JSON lines (instead of a Tk variable).
+    """
+    def __init__(self, source, stream=None):
+        self.source = source
+        self.stream = stream or sys.stdout
+
+    def emit(self, event, **kwargs):
+        record = {'time': round(time.time(), 3), 'event': event, 'source': self.source, **kwargs}
+        self.stream.write(f'{json.dumps(record)}\n')
+        self.stream.flush()
+
+    def set(self, msg):
+        self.emit('status', message=msg)
+
+
+def extract_source(kind, source, output, jobs=1, **kwargs):
+    """
+    Runs a headless extraction of a single source, returns the work directory.
+
+    Args:
+        kind (str): tar|ab|dir
+        source (str): path to the tar file, AB file or directory.
+        output (str): output directory where the work directory is created.
+        jobs (int): number of decoding processes.
+    """
+    progress = kwargs.pop('progress', None) or JsonProgress(source)
+    options = {'tar': 'tarfile', 'ab': 'backup', 'dir': 'src_dir'}
+    drill = driller.ChainExecution(
+        output,
+        status_msg=progress,
+        jobs=jobs,
+        **{options[kind]: source},
+        **kwargs)
+    drill.CreateWorkDir()
+    if kind == 'dir':
+        drill.ExtractFromDir()
+    else:
+        drill.DataExtraction()
+    drill.DataDecoding()
+    if kind == 'ab':
+        drill.DecodeShared()
+    drill.GenerateHtmlReport(open_html=False)
+    drill.GenerateXlsxReport()
+    drill.CleanUp()
+    return drill.work_dir
+
+
+def extract_usb(output, jobs=1, **kwargs):
+    """
+    Runs a headless extraction of all connected devices, returns {serial: work_dir or exception}.
+    """
+    from .sessions import SessionManager, Scheduler
+    session = SessionManager(output, scheduler=Scheduler(decoders=jobs), **kwargs)
+    return session.run()
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser(
+        'extract',
+        help='Headless extraction and decoding (no GUI), progress is printed as JSON lines.')
+    parser.add_argument('--tar', action='append', default=[], help='TAR file to parse (repeatable).')
+    parser.add_argument('--ab', action='append', default=[], help='AB file to parse (repeatable).')
+    parser.add_argument('--dir', action='append', default=[], help='Directory to parse (repeatable).')
+    parser.add_argument('--usb', action='store_true', help='Extract all connected USB devices.')
+    parser.add_argument('--out', required=True, help='Output directory.')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of decoding processes.')
+    parser.add_argument('--link', action='store_true', help='Hard-link (instead of copy) files parsed from directories, if on the same filesystem.')
+    parser.add_argument('--store', choices=['tar', 'cas'], default='tar',
+        help='DataStore format: a tar of all artefacts, or a content-addressed store (written once).')
+    parser.add_argument('--trace', action='store_true', help='Also save stage timings as a Chrome trace file.')
+    parser.add_argument('--cache', action='store_true', help='Reuse decoded results of unchanged databases from earlier extractions.')
+    return parser
+
+
+def main(args):
+    """
+    Runs `extract` for the parsed arguments, returns the exit code (1 if any source failed).
+    """
+    if not os.path.isdir(args.out):
+        os.makedirs(args.out)
+    sources = [(kind, src) for kind in ['tar', 'ab', 'dir'] for src in getattr(args, kind)]
+    failed = 0
+    for kind, source in sources:
+        progress = JsonProgress(source)
+        progress.emit('start', kind=kind)
+        try:
+            work_dir = extract_source(kind, source, args.out, jobs=args.jobs, progress=progress, trace=args.trace, link_files=args.link,
+                data_store=args.store, cache=DecodeCache() if args.cache else None)
+            progress.emit('done', work_dir=work_dir)
+        except Exception as err:
+            logger.exception(f'Extraction failed for {source}: {err}')
+            progress.emit('error', message=str(err))
+            failed += 1
+    if args.usb:
+        for serial, result in extract_usb(args.out, jobs=args.jobs).items():
+            progress = JsonProgress(serial)
+            if isinstance(result, Exception):
+                progress.emit('error', message=str(result))
+                failed += 1
+            else:
+                progress.emit('done', work_dir=result)
+    return int(bool(failed))
@@ -2,6 +2,7 @@ import os
 import sys
 import time
 import logging
+import threading
 import pathlib
 import datetime
 import requests
@@ -27,13 +28,36 @@ SQLITE_MAGIC = b'SQLite format 3\x00'
 GZIP_MAGIC = b'\x1f\x8b\x08'
 
 
+_CONFIGS = {}  # {config_file: Config}
+_CONFIGS_LOCK = threading.RLock()
+
+
+def get_config():
+    """
+    Returns the shared `Config` of the current user's config file, which is read once per process.
+    """
+    config_file = Config.get_config_file()
+    with _CONFIGS_LOCK:
+        if config_file not in _CONFIGS:
+            _CONFIGS[config_file] = Config()
+        return _CONFIGS[config_file]
+
+
+def invalidate_config(config_file=None):
+    """
+    Drops the shared `Config`, so it is read again by the next `get_config()`.
+    """
+    with _CONFIGS_LOCK:
+        _CONFIGS.pop(config_file or Config.get_config_file(), None)
+
+
 class Config:
     NS = 'DEFAULT'
 
     def __init__(self):
         self.OS = sys.platform
         self.appdirs = AppDirs(appname=__package_name__)
-        self.config_file = os.path.join(self.appdirs.user_config_dir, 'config.ini')
+        self.config_file = self.get_config_file(self.appdirs)
         self.conf = configparser.ConfigParser(allow_no_value=True)
         self.make_folders_files()
         self.tzone = None
@@ -41,6 +65,11 @@ class Config:
         self.setup_tz()
         self.update_available = False
 
+    @staticmethod
+    def get_config_file(appdirs=None):
+        appdirs = appdirs or AppDirs(appname=__package_name__)
+        return os.path.join(appdirs.user_config_dir, 'config.ini')
+
     def __call__(self, key):
         return self.conf[self.NS][key]
 
@@ -75,6 +104,7 @@ class Config:
             self.conf.write(cfw)
         self.conf.read(self.config_file)
         self.setup_tz()
+        invalidate_config(self.config_file)
 
     @staticmethod
     def hex_time_now() -> str:
@@ -0,0 +1,58 @@
+import os
+import json
+import shutil
+import logging
+import threading
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+
+class ContentStore:
+    """
+    Content-addressed DataStore, an alternative to `DataStore.tar`.
+    Each artefact is stored once as `objects/<hash[:2]>/<hash>`, as a hard link to the extracted
+    file (so nothing is written twice), or a copy where linking is not possible.
+    `index.json` maps archive names (remote paths) to hashes and sizes.
+    """
+    INDEX = 'index.json'
+
+    def __init__(self, path, algo='sha256'):
+        self.path = path
+        self.algo = algo
+        self.objects = os.path.join(path, 'objects')
+        self.index_file = os.path.join(path, self.INDEX)
+        self.index = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.objects, exist_ok=True)
+        if os.path.isfile(self.index_file):
+            with open(self.index_file, 'r') as R:
+                self.index = json.load(R)
+
+    @property
+    def name(self):
+        return self.index_file
+
+    def object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def add(self, name, arcname=None):
+        """
+        Adds a file to the store, same signature as `TarFile.add`.
+        """
+        digest = utils.get_hash(name, algo=self.algo)
+        obj = self.object_path(digest)
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            try:
+                os.link(name, obj)
+            except OSError:
+                shutil.copy2(name, obj)
+        with self.lock:
+            self.index[arcname or name] = {'hash': digest, 'size': os.path.getsize(name)}
+        return digest
+
+    def close(self):
+        with self.lock:
+            with open(self.index_file, 'w') as W:
+                json.dump(self.index, W, indent=2, sort_keys=True)
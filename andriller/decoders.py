@@ -1,3 +1,4 @@
+import os
 import re
 import json
 import javaobj
@@ -219,9 +220,9 @@ class GenericCallsDecoder(AndroidDecoder):
         for i in self.sql_table_as_dict(table, order_by='date'):
             i['type'] = self.call_type(i['type'])
             i['number'] = self.parse_number(i['number'])
-            i['date'] = self.unix_to_time_ms(i['date'])
             i['duration'] = self.duration(i['duration'])
             self.DATA.append(i)
+        self.time_column(self.DATA, 'date')
 
 
 # -----------------------------------------------------------------------------
@@ -237,9 +238,9 @@ class SamsungCallsDecoder(GenericCallsDecoder):
         for i in self.sql_table_as_dict(table, **kw):
             i['type'] = self.call_type(i['type'])
             i['number'] = self.parse_number(i['number'])
-            i['date'] = self.unix_to_time_ms(i['date'])
             i['duration'] = self.duration(i['duration'])
             self.DATA.append(i)
+        self.time_column(self.DATA, 'date')
 
 
 # -----------------------------------------------------------------------------
@@ -272,8 +273,8 @@ class SamsungSnippetsDecoder(AndroidDecoder):
         for i in self.sql_table_as_dict(table, **kw):
             i['type'] = self.sms_type(i['type'])
             i['number'] = self.parse_number(i['number'])
-            i['date'] = self.unix_to_time_ms(i['date'])
             self.DATA.append(i)
+        self.time_column(self.DATA, 'date')
 
 
 # -----------------------------------------------------------------------------
@@ -295,9 +296,9 @@ class SMSMMSDecoder(AndroidDecoder):
         table = 'sms'
         for i in self.sql_table_as_dict(table, order_by='date'):
             i['address'] = self.parse_number(i['address'])
-            i['date'] = self.unix_to_time_ms(i['date'])
             i['type'] = self.sms_type(i['type'])
             self.DATA.append(i)
+        self.time_column(self.DATA, 'date')
 
 
 # -----------------------------------------------------------------------------
@@ -353,10 +354,10 @@ class WhatsAppCallsDecoder(GenericCallsDecoder):
         for i in self.sql_table_as_dict(table, **kw):
             i['number'] = self.num(i['key_remote_jid'])
             # IDEA: try getting name from wa.db?
-            i['date'] = self.unix_to_time_ms(i['timestamp'])
             i['type'] = self.call_type(i['key_from_me'], i['media_duration'])
             i['duration'] = self.duration(i['media_duration'])
             self.DATA.append(i)
+        self.time_column(self.DATA, 'timestamp', target='date')
 
 
 # -----------------------------------------------------------------------------
@@ -374,6 +375,23 @@ class WhatsAppMessagesDecoder(AndroidDecoder):
         'type': 'Type',
         'timestamp': 'Time',
     }
+    streamed = True
+    # Chat subject and thumbnail joined in by SQLite (the last one per chat / per message key)
+    columns = ['messages.*', 'chats.subject AS chat_subject', 'thumbs.thumbnail AS thumbnail']
+    joins = [
+        "LEFT JOIN (SELECT key_remote_jid, subject, max(rowid) FROM chat_list WHERE NOT subject='' "
+        "GROUP BY key_remote_jid) AS chats ON chats.key_remote_jid = messages.key_remote_jid",
+        "LEFT JOIN (SELECT key_id, max(rowid) AS thumb_rowid FROM message_thumbnails GROUP BY key_id) "
+        "AS thumb_ids ON thumb_ids.key_id = messages.key_id",
+        "LEFT JOIN message_thumbnails AS thumbs ON thumbs.rowid = thumb_ids.thumb_rowid",
+    ]
+    where_messages = {'!messages.status': [6, -1]}
+    # Participant numbers aggregated per group, in table order ('' is the device owner)
+    parts_columns = [
+        'gjid',
+        "group_concat(CASE WHEN jid IS NULL OR jid = '' THEN '' WHEN jid = 'status@broadcast' THEN 'broadcast' "
+        "ELSE '+' || substr(jid, 1, instr(jid || '@', '@') - 1) END, char(31))",
+    ]
 
     def __init__(self, work_dir, input_file, **kwargs):
         super().__init__(work_dir, input_file, **kwargs)
@@ -407,23 +425,16 @@ class WhatsAppMessagesDecoder(AndroidDecoder):
             return jid if solo else self.num(item['remote_resource'])
 
     def encode_raw_data(self, item):
-        raw_data, key_id = item.get('raw_data'), item.get('key_id')
-        if raw_data and item.get('raw_data'):
+        raw_data, thumbnail = item.get('raw_data'), item.pop('thumbnail', None)
+        if raw_data:
             return self.b64e(raw_data)
-        if key_id and key_id in self.thumbs:
-            return self.b64e(self.thumbs[key_id])
+        if thumbnail:
+            return self.b64e(thumbnail)
 
     def get_javaobj(self, item):
         if item.get('thumb_image'):
             return javaobj.loads(item['thumb_image'])
 
-    def populate_chats(self):
-        self.chats = {
-            k: v for (k, v) in self.sql_table_rows(
-                'chat_list',
-                columns=('key_remote_jid', 'subject'),
-                where={'!subject': ''},)}
-
     def populate_owner(self):
         self.owner = '(This device)'
         prefs = self.get_neighbour('com.whatsapp_preferences.xml')
@@ -434,39 +445,39 @@ class WhatsAppMessagesDecoder(AndroidDecoder):
 
     def populate_parts(self):
         # TODO: 'group_patricipants_history' table
-        self.parts = collections.defaultdict(list)
-        for g, j in self.sql_table_rows('group_participants', columns=('gjid', 'jid')):
-            self.parts[g].append(self.num(j) if j else self.owner)
-
-    def populate_broadcast(self):
-        self.thumbs = {}
-        for d in self.sql_table_as_dict('message_thumbnails'):
-            self.thumbs[d['key_id']] = d['thumbnail']
+        self.parts = {
+            gjid: [num or self.owner for num in nums.split('\x1f')] for gjid, nums in
+            self.sql_table_rows('(SELECT * FROM group_participants ORDER BY rowid)',
+                columns=self.parts_columns, group_by='gjid')}
 
     def main(self):
-        self.populate_chats()
         self.populate_owner()
         self.populate_parts()
-        self.populate_broadcast()
-
-        # Process main messages
-        table = 'messages'
-        kw = {'where': {'!status': [6, -1]}, 'order_by': 'timestamp'}
-        for i in self.sql_table_as_dict(table, **kw):
-            i['sender'] = self.get_sender(i)
-            i['recipients'] = self.get_recipients(i)
-            i['x_recipients'] = '\n'.join(i['recipients'])
-            i['x_message'] = f"{i['data'] or ''}"
-            i['timestamp'] = self.unix_to_time_ms(i['timestamp'])
-            i['type'] = 'Sent' if i['key_from_me'] else 'Inbox'
-            i['raw_data'] = self.encode_raw_data(i)
-            data_obj = self.get_javaobj(i)
-            if hasattr(data_obj, 'file') and hasattr(data_obj.file, 'path'):
-                i['file_path'] = data_obj.file.path
-            if hasattr(data_obj, 'fileSize') and data_obj.fileSize:
-                i['file_size'] = utils.human_bytes(data_obj.fileSize)
-            i['chat'] = self.chats.get(i['key_remote_jid'], self.key_jid(i))
-            self.DATA.append(i)
+        self.row_count = self.sql_table_count('messages', where=self.where_messages)
+
+    def process_message(self, i):
+        i['sender'] = self.get_sender(i)
+        i['recipients'] = self.get_recipients(i)
+        i['x_recipients'] = '\n'.join(i['recipients'])
+        i['x_message'] = f"{i['data'] or ''}"
+        i['type'] = 'Sent' if i['key_from_me'] else 'Inbox'
+        i['raw_data'] = self.encode_raw_data(i)
+        data_obj = self.get_javaobj(i)
+        if hasattr(data_obj, 'file') and hasattr(data_obj.file, 'path'):
+            i['file_path'] = data_obj.file.path
+        if hasattr(data_obj, 'fileSize') and data_obj.fileSize:
+            i['file_size'] = utils.human_bytes(data_obj.fileSize)
+        i['chat'] = i.pop('chat_subject') or self.key_jid(i)
+        return i
+
+    def iter_data(self):
+        to_time = self.time_converter()
+        with self:
+            kw = {'where': self.where_messages, 'order_by': 'messages.timestamp'}
+            for i in self.sql_table_iter('messages', columns=self.columns, joins=self.joins, **kw):
+                i = self.process_message(i)
+                i['timestamp'] = to_time(i['timestamp'])
+                yield i
 
 
 # -----------------------------------------------------------------------------
@@ -501,9 +512,9 @@ class KikMessagesDecoder(AndroidDecoder):
         kw = {'where': {'read_state': 500}, 'order_by': 'timestamp'}
         for i in self.sql_table_as_dict(table, **kw):
             i['display_name'] = contacts.get(i['partner_jid'], '{}')
-            i['timestamp'] = self.unix_to_time_ms(i['timestamp'])
             i['type'] = 'Sent' if i['was_me'] else 'Inbox'
             self.DATA.append(i)
+        self.time_column(self.DATA, 'timestamp')
 
 
 # -----------------------------------------------------------------------------
@@ -522,6 +533,9 @@ class FacebookMessagesDecoder(AndroidDecoder):
         'x_recipients': 'Recipients',
         'timestamp': 'Time',
     }
+    streamed = True
+    where_messages = {'msg_type': [0, 9]}
+    order_messages = 'timestamp_ms'  # also the column of the message time
 
     def __init__(self, work_dir, input_file, **kwargs):
         self.parts = collections.defaultdict(list)
@@ -567,9 +581,9 @@ class FacebookMessagesDecoder(AndroidDecoder):
     def process_stickers(self):
         stickers_db = self.get_neighbour('stickers_db')
         if stickers_db:
-            dec = AndroidDecoder(None, stickers_db, stage=True)
-            for k, v in dec.sql_table_rows('stickers', columns=['id', 'uri']):
-                self.stickers[k] = v
+            with AndroidDecoder(None, stickers_db, stage=True) as dec:
+                for k, v in dec.sql_table_rows('stickers', columns=['id', 'uri']):
+                    self.stickers[k] = v
 
     def get_sticker(self, item):
         sticker = item.get('sticker_id')
@@ -605,24 +619,30 @@ class FacebookMessagesDecoder(AndroidDecoder):
         self.process_users()
         self.process_parts()
         self.process_stickers()
-
-        # Process main messages
-        table = 'messages'
-        kw = {'where': {'msg_type': [0, 9]}, 'order_by': 'timestamp_ms'}
-        for i in self.sql_table_as_dict(table, **kw):
-            sender = json.loads(i['sender'])
-            i['sender'] = sender['name']
-            i['user_key'] = sender['user_key']
-            i['user_id'] = sender['user_key'].split(':')[1]
-            i['sender_info'] = self.users.get(i['user_key'], {})
-            i['attachments'] = self.get_attach(i)
-            i['shares'] = self.get_shares(i)
-            i['sticker'] = self.get_sticker(i)
-            i['recipients'] = self.get_recipients(i)
-            i['timestamp'] = self.unix_to_time_ms(i['timestamp_ms'])
-            i['x_recipients'] = self.recipients_xls(i['recipients'])
-            i['x_text'] = i.get('text') or '<Media content>'
-            self.DATA.append(i)
+        self.row_count = self.sql_table_count('messages', where=self.where_messages)
+
+    def process_message(self, i):
+        sender = json.loads(i['sender'])
+        i['sender'] = sender['name']
+        i['user_key'] = sender['user_key']
+        i['user_id'] = sender['user_key'].split(':')[1]
+        i['sender_info'] = self.users.get(i['user_key'], {})
+        i['attachments'] = self.get_attach(i)
+        i['shares'] = self.get_shares(i)
+        i['sticker'] = self.get_sticker(i)
+        i['recipients'] = self.get_recipients(i)
+        i['x_recipients'] = self.recipients_xls(i['recipients'])
+        i['x_text'] = i.get('text') or '<Media content>'
+        return i
+
+    def iter_data(self):
+        to_time = self.time_converter()
+        with self:
+            kw = {'where': self.where_messages, 'order_by': self.order_messages}
+            for i in self.sql_table_iter('messages', **kw):
+                i = self.process_message(i)
+                i['timestamp'] = to_time(i[self.order_messages])
+                yield i
 
 
 # -----------------------------------------------------------------------------
@@ -630,6 +650,8 @@ class FacebookMessagesLiteDecoder(FacebookMessagesDecoder):
     TARGET = 'core.db'
     PACKAGE = 'com.facebook.mlite'
     title = 'Facebook Messenger Lite'
+    where_messages = {}
+    order_messages = 'timestamp'
 
     @staticmethod
     def user_info(d):
@@ -659,18 +681,11 @@ class FacebookMessagesLiteDecoder(FacebookMessagesDecoder):
                 columns=['participant_thread_key', 'participant_id']):
             self.parts[k].append(v)
 
-    def main(self):
-        self.process_users()
-        self.process_parts()
-        self.process_stickers()
-
-        table = 'messages'
-        for i in self.sql_table_as_dict(table, order_by='timestamp'):
-            i['sender_info'] = self.users.get(i['user_id'], {})
-            i['text'] = i['snippet']
-            i['recipients'] = self.get_recipients(i)
-            i['timestamp'] = self.unix_to_time_ms(i['timestamp'])
-            self.DATA.append(i)
+    def process_message(self, i):
+        i['sender_info'] = self.users.get(i['user_id'], {})
+        i['text'] = i['snippet']
+        i['recipients'] = self.get_recipients(i)
+        return i
 
 
 # -----------------------------------------------------------------------------
@@ -704,9 +719,9 @@ class SkypeMessagesLegacyDecoder(AndroidDecoder):
             i['identity'] = self.convos.get(i['convo_id'], '')
             i['chatmsg_status'] = self.skype_msg_type(i['chatmsg_status'])
             i['type'] = 'Inbox' if i['author'] == i['identity'] else 'Sentbox'
-            i['timestamp'] = self.unix_to_time(i['timestamp'])
             # i['timestamp__ms'] = self.unix_to_time_ms(i['timestamp__ms'])
             self.DATA.append(i)
+        self.time_column(self.DATA, 'timestamp', unit='s')
 
 
 # -----------------------------------------------------------------------------
@@ -765,8 +780,8 @@ class SkypeMessagesDecoder(AndroidDecoder):
             i['x_conversation'] = self.skype_name(i['conversation'])
             # TODO: add skype_media.html snip
             i['direction'] = 'Outgoing' if i['is_sender_me'] else 'Incoming'
-            i['time'] = self.unix_to_time_ms(i['time'])
             self.DATA.append(i)
+        self.time_column(self.DATA, 'time')
 
 
 # -----------------------------------------------------------------------------
@@ -788,6 +803,7 @@ class SkypeCallsDecoder(SkypeMessagesDecoder):
 
         table = 'chatItem'
         kw = {'where': {'message_type': 3}, 'order_by': 'time'}
+        to_time = self.time_converter()
         for i in self.sql_table_as_dict(table, **kw):
             i['type'] = self.skype_call_type(i['type'])
             i['sender'] = self.get_sender(i)
@@ -795,7 +811,7 @@ class SkypeCallsDecoder(SkypeMessagesDecoder):
             i['conversation'] = self.get_convo(i)
             i['x_conversation'] = self.skype_name(i['conversation'])
             time_ = i['time'] - i['duration']
-            i['time'] = self.unix_to_time_ms(time_)
+            i['time'] = to_time(time_)
             i['duration'] = self.duration(i['duration'] // 1000)
             self.DATA.append(i)
 
@@ -857,8 +873,8 @@ class ViberMessagesDecoder(AndroidDecoder):
             if i['msg_info']:
                 i['media'] = utils.get_koi(i['msg_info'], artefacts_of_interest)
             i['send_type'] = 'Outgoing' if i['send_type'] else 'Incoming'
-            i['msg_date'] = self.unix_to_time_ms(i['msg_date'])
             self.DATA.append(i)
+        self.time_column(self.DATA, 'msg_date')
 
 
 # -----------------------------------------------------------------------------
@@ -910,9 +926,9 @@ class ViberCallsDecoder(GenericCallsDecoder):
             i['type'] = self.call_type(i['type'])
             if i['viber_call_type'] == 4:
                 i['type'] += ' (Video)'
-            i['date'] = self.unix_to_time_ms(i['date'])
             i['duration'] = self.duration(i['duration'])
             self.DATA.append(i)
+        self.time_column(self.DATA, 'date')
 
 
 # -----------------------------------------------------------------------------
@@ -1107,41 +1123,87 @@ class Registry:
     def __post_init__(self):
         self.populate()
 
+    PACKAGE_LIKE = re.compile(r'^[a-z]\w*(\.\w+)+$')
+
     def populate(self):
         for obj in AndroidDecoder.get_subclasses():
             if obj.exclude_from_registry:
                 continue
             self.decoders[obj] = pathlib.PurePosixPath(obj.RETARGET or obj.TARGET)
+        self.packages = {deco.PACKAGE for deco in self.decoders if deco.PACKAGE}
+        self.build_index()
+
+    @staticmethod
+    def is_packages_dir(dir_path):
+        """
+        True if a directory is where app package directories are kept:
+        `data/data`, `user/<n>`, `user_de/<n>` or `apps` (Android backups).
+        """
+        parts = pathlib.PurePath(dir_path).parts[-2:]
+        return parts[-1:] == ('apps',) or parts == ('data', 'data') or (
+            len(parts) == 2 and parts[0] in ('user', 'user_de') and parts[1].isdigit())
+
+    def is_foreign_package(self, dir_path):
+        """
+        True if a directory is an app package directory (in a packages directory), which has no decoders.
+        Dotted directory names elsewhere (eg: `case.2021`) are never matched.
+        """
+        parent, dir_name = os.path.split(dir_path)
+        return dir_name not in self.packages and bool(self.PACKAGE_LIKE.match(dir_name)) and \
+            self.is_packages_dir(parent)
+
+    def build_index(self):
+        """
+        Precompiles targets: static names are looked up in a dict, globbed names are matched by regex.
+        """
+        self._order = {deco: n for n, deco in enumerate(self.decoders)}
+        self._static = collections.defaultdict(list)
+        self._globs = collections.defaultdict(list)
+        for deco, x in self.decoders.items():
+            name = x.as_posix()
+            if '*' in name:
+                self._globs[name].append(deco)
+            else:
+                self._static[name].append(deco)
+        self._globs = [(re.compile(f'^{utils.glob_to_regex(k)}$'), v) for k, v in self._globs.items()]
+        self._has_glob = re.compile('|'.join(k.pattern for k, _ in self._globs) or '(?!)')
+
+    @staticmethod
+    def target_name(target_file):
+        return str(target_file).rsplit('/', 1)[-1]
 
     def has_target(self, target_file):
-        target = pathlib.PurePosixPath(target_file)
-        for x in self.decoders.values():
-            if target.match(x.as_posix()):
-                return True
-        return False
+        name = self.target_name(target_file)
+        return name in self._static or bool(self._has_glob.match(name))
 
     def decoders_target(self, target_file):
-        decoders = []
-        target = pathlib.PurePosixPath(target_file)
-        for deco, x in self.decoders.items():
-            if deco.exclude_from_decoding:
-                continue
-            if target.match(x.as_posix()):
-                decoders.append(deco)
-        return decoders
+        name = self.target_name(target_file)
+        decoders = [*self._static.get(name, [])]
+        for rex, decos in self._globs:
+            if rex.match(name):
+                decoders.extend(decos)
+        decoders = filter(lambda deco: not deco.exclude_from_decoding, decoders)
+        return sorted(decoders, key=self._order.get)
 
     # def decoders_package(self, package):
     #     return list(filter(lambda x: x.PACKAGE == package, self.decoders))
 
     def get_root_links(self):
-        root_links = []
-        for dec in self.decoders:
-            dec = dec.staged()
+        return sorted(set(itertools.chain(*self.get_root_link_groups().values())))
+
+    def get_root_link_groups(self):
+        """
+        Returns root links grouped by decoder: {decoder: [target, sidecars.., extras..]}
+        """
+        groups = {}
+        for deco in self.decoders:
+            dec = deco.staged()
             if dec.target_path_root:
-                root_links.append(dec.get_artifact(dec.target_path_root))
+                links = dec.get_artifact(dec.target_path_root)
                 if dec.EXTRAS:
-                    root_links.append(dec.get_extras())
-        return sorted(set(itertools.chain(*root_links)))
+                    links.extend(dec.get_extras())
+                groups[deco] = links
+        return groups
 
     def get_ab_links(self):
         ab_links = []
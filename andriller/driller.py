@@ -1,29 +1,51 @@
 import os
 import re
+import sys
+import json
 import time
 import shutil
 import logging
 import tarfile
 import pathlib
-import tempfile
 import webbrowser
 import threading
+import functools
+import collections
+import multiprocessing
+import concurrent.futures
 from contextlib import suppress
 from . import utils
 from . import engines
-from . import messages
 from . import decoders
 from . import adb_conn
+from . import timings
+from . import datastore
 
 logger = logging.getLogger(__name__)
 
 
+def timed(method):
+    """
+    Records the duration of a ChainExecution stage in `self.timings`.
+    """
+    @functools.wraps(method)
+    def func(self, *args, **kwargs):
+        with self.timings.stage(method.__name__):
+            return method(self, *args, **kwargs)
+    return func
+
+
 # -----------------------------------------------------------------------------
 class ChainExecution:
     USER = 'shell'
     ROOT = 'root'
     ROOTSU = 'root-su'
     DATA_STORE = 'DataStore.tar'
+    CONTENT_STORE = 'DataStore'
+    MANIFEST_FILE = 'manifest.json'
+    TIMINGS_FILE = 'timings.json'
+    TRACE_FILE = 'timings.trace.json'
+    PROBE_TIMEOUT = 5
     extract_dir = 'data'
 
     def __init__(self, base_dir, status_msg=None, use_adb=False, **kwargs):
@@ -31,138 +53,219 @@ class ChainExecution:
         self.base_dir = base_dir
         self.work_dir = None
         self.updater = status_msg
+        self.serial = kwargs.get('serial')
+        self.scheduler = kwargs.get('scheduler')
         if use_adb:
-            self.adb = adb_conn.ADBConn()
+            self.adb = adb_conn.ADBConn(serial=self.serial)
         self.registry = decoders.Registry()
         self.targets = None
         self.REPORT = {}
         self.DECODED = []
         self.DOWNLOADS = []
         self.DataStore = None
+        self.data_store = kwargs.get('data_store', 'tar')  # tar|cas
+        self.MANIFEST = {}
+        self.PREVIOUS = {}
+        self.previous = kwargs.get('previous')
         self.do_shared = kwargs.get('do_shared', False)
         self.backup = kwargs.get('backup')
         # self.backup_pw = kwargs.get('backup_pw')  # TODO
         self.tarfile = kwargs.get('tarfile')
+        self.backup_tar = None  # tar converted from the backup, removed by CleanUp
         self.src_dir = kwargs.get('src_dir')
+        self.link_files = kwargs.get('link_files', False)
         self.WB = None
+        self.jobs = kwargs.get('jobs', 1)
+        self.pipeline = kwargs.get('pipeline', True)
+        self.decode_pool = None
+        self.process_pool = None
+        self.FUTURES = {}
+        self.timings = timings.Timings()
+        self.cache = kwargs.get('cache')
+        self.trace = kwargs.get('trace', False)
         self.logger = kwargs.get('logger', logger)
 
     def setup(self):
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
-        data_store = os.path.join(self.work_dir, self.DATA_STORE)
-        self.DataStore = tarfile.open(data_store, 'a')
+        if self.data_store == 'cas':
+            self.DataStore = datastore.ContentStore(os.path.join(self.work_dir, self.CONTENT_STORE))
+        else:
+            data_store = os.path.join(self.work_dir, self.DATA_STORE)
+            self.DataStore = tarfile.open(data_store, 'a')
+        if self.previous:
+            self.load_previous()
+
+    def load_previous(self):
+        """
+        Loads the manifest of a previous extraction (its work directory), to skip unchanged files.
+        """
+        manifest = os.path.join(self.previous, self.MANIFEST_FILE)
+        if not os.path.isfile(manifest):
+            self.logger.warning(f'No manifest found in previous extraction: {self.previous}')
+            return
+        with open(manifest, 'r') as R:
+            self.PREVIOUS = json.load(R)
+        self.logger.debug(f'Loaded previous manifest with {len(self.PREVIOUS)} files.')
+
+    def write_manifest(self):
+        manifest = os.path.join(self.work_dir, self.MANIFEST_FILE)
+        with open(manifest, 'w') as W:
+            json.dump(self.MANIFEST, W, indent=2, sort_keys=True)
+
+    def write_timings(self):
+        self.timings.dump(os.path.join(self.work_dir, self.TIMINGS_FILE))
+        if self.trace:
+            self.timings.dump_trace(os.path.join(self.work_dir, self.TRACE_FILE))
 
     def CleanUp(self):
+        if self.MANIFEST:
+            self.write_manifest()
         self.DataStore.close()
-        datastore_file = os.path.abspath(self.DataStore.fileobj.name)
-        utils.hash_file(datastore_file)
-        # Delete temp tar file
-        default_temp = tempfile.gettempdir()
-        tf = self.tarfile
-        if tf and os.path.isfile(tf) and tf.startswith(default_temp):
-            os.remove(tf)
+        datastore_file = os.path.abspath(self.DataStore.name)
+        with self.timings.stage('CleanUp.hash', bytes=os.path.getsize(datastore_file)):
+            utils.hash_file(datastore_file)
+        # Delete the tar converted from the backup (never a source tar given by the user)
+        if self.backup_tar and os.path.isfile(self.backup_tar):
+            os.remove(self.backup_tar)
+        self.write_timings()
         self.update('Finished.')
 
+    def slot(self, resource):
+        """
+        Context for a shared resource ('transfer' or 'decode'), limited by the scheduler when one is set.
+        """
+        if self.scheduler:
+            return self.scheduler.slot(resource)
+        return suppress()
+
     def update(self, msg, info=True):
         self.logger.info(msg) if info else logger.debug(msg)
         if self.updater:
             self.updater.set(msg)
-            self.updater._root.update()
+            if hasattr(self.updater, '_root'):
+                self.updater._root.update()
 
-    def InitialAdbRead(self):
-        self.update('Reading information...')
-
-        def get_permission():
-            self.su = False
-            if self.ROOT in self.adb.adb_out('id'):
-                self.permisson = self.ROOT
-                return self.permisson
-            if self.ROOT in self.adb.adb_out('id', su=True):
-                self.permisson = self.ROOTSU
-                self.su = True
-            else:
-                self.permisson = self.USER
+    def get_permission(self):
+        self.su = False
+        if self.ROOT in self.adb.adb_out('id'):
+            self.permisson = self.ROOT
             return self.permisson
+        if self.ROOT in self.adb.adb_out('id', su=True):
+            self.permisson = self.ROOTSU
+            self.su = True
+        else:
+            self.permisson = self.USER
+        return self.permisson
 
-        def get_prop(prop: list, key: str):
-            for row in prop:
-                if key in row:
-                    return row.strip().split('=')[1]
+    @staticmethod
+    def get_prop(prop: list, key: str):
+        for row in prop:
+            if key in row:
+                return row.strip().split('=')[1]
 
-        def get_wifi(dump: list):
-            dump = list(filter(lambda x: x.startswith('mWifiInfo'), dump))
-            if dump:
-                src = re.search(r'MAC: ([:0-9a-f]{17}),', dump[0])
-                if src:
-                    return src.groups()[0]
+    @staticmethod
+    def get_wifi(dump: list):
+        dump = list(filter(lambda x: x.startswith('mWifiInfo'), dump))
+        if dump:
+            src = re.search(r'MAC: ([:0-9a-f]{17}),', dump[0])
+            if src:
+                return src.groups()[0]
 
-        def get_accounts(dump):
-            accs = re.findall(r'Account \{name=(.+?), type=(.+?)\}', dump, re.S)
-            return [(v, k) for k, v in accs]
+    @staticmethod
+    def get_accounts(dump):
+        accs = re.findall(r'Account \{name=(.+?), type=(.+?)\}', dump, re.S)
+        return [(v, k) for k, v in accs]
+
+    def probe_build_prop(self):
+        report = {}
+        build_prop = self.adb.adb_out('cat /system/build.prop', su=self.su, timeout=self.PROBE_TIMEOUT)
+        if build_prop:
+            build_prop = build_prop.split('\n')
+            props = [
+                'ro.product.manufacturer',
+                'ro.product.model',
+                'ro.build.version.release',
+                'ro.build.display.id']
+            for p in props:
+                report[p] = self.get_prop(build_prop, p)
+        return report
+
+    def probe_wifi(self):
+        _wifi = self.adb.adb_out('dumpsys wifi', timeout=self.PROBE_TIMEOUT)
+        if _wifi:
+            return {'wifi mac': self.get_wifi(_wifi.split('\n'))}
+
+    def probe_imei(self):
+        _usbinfo = self.adb.adb_out('dumpsys iphonesubinfo', timeout=self.PROBE_TIMEOUT)
+        if _usbinfo:
+            return {'imei': self.get_prop(_usbinfo.split('\n'), 'Device ID')}
+
+    # IMEI for Android v6+
+    # def probe_imei_v6(self):
+    #     rex = re.compile(b' ([0-9a-f]{8})')
+    #     _data = self.adb.adb_out('service call iphonesubinfo 1', timeout=2)
+    #     if _data and len(_data) > 9:
+    #         plen = int(b''.join(_data[:2]), 16)
+
+    def probe_time(self):
+        rtime = self.adb.adb_out(r"date '+%F\ %T\ %Z'", timeout=self.PROBE_TIMEOUT)
+        rtime = rtime.replace('\\', '')
+        return {'device_time': rtime.split(self.adb.rmr.decode())[-1]}
+
+    def probe_sim(self):
+        report = {}
+        if self.adb.exists('/data/system/SimCard.dat', su=self.su, timeout=self.PROBE_TIMEOUT):
+            _simdat = self.adb.adb_out('cat /data/system/SimCard.dat', su=self.su, timeout=self.PROBE_TIMEOUT)
+            sims = [
+                'CurrentSimSerialNumber',
+                'CurrentSimPhoneNumber',
+                'CurrentSimOperatorName',
+                'PreviousSimSerialNumber',
+                'PreviousSimPhoneNumber']
+            if _simdat:
+                _simdat = _simdat.split('\n')
+                for s in sims:
+                    report[s] = self.get_prop(_simdat, s)
+        return report
+
+    def probe_accounts(self):
+        _acc = self.adb.adb_out('dumpsys account', timeout=self.PROBE_TIMEOUT)
+        return {'accounts': self.get_accounts(_acc)}
+
+    @timed
+    def InitialAdbRead(self):
+        self.update('Reading information...')
 
         # Serial, status, permissions
         self.REPORT['serial'], self.REPORT['status'] = self.adb.device()
-        self.REPORT['permisson'] = get_permission()
-
-        # Build Props
-        with suppress(TimeoutError):
-            build_prop = self.adb.adb_out('cat /system/build.prop', su=self.su, timeout=5)
-            if build_prop:
-                build_prop = build_prop.split('\n')
-                props = [
-                    'ro.product.manufacturer',
-                    'ro.product.model',
-                    'ro.build.version.release',
-                    'ro.build.display.id']
-                for p in props:
-                    self.REPORT[p] = get_prop(build_prop, p)
-
-        # WIFI
-        with suppress(TimeoutError):
-            _wifi = self.adb.adb_out('dumpsys wifi', timeout=5)
-            if _wifi:
-                self.REPORT['wifi mac'] = get_wifi(_wifi.split('\n'))
-
-        # IMEI
-        with suppress(TimeoutError):
-            _usbinfo = self.adb.adb_out('dumpsys iphonesubinfo', timeout=5)
-            if _usbinfo:
-                self.REPORT['imei'] = get_prop(_usbinfo.split('\n'), 'Device ID')
-
-        # IMEI for Android v6+
-        # with suppress(TimeoutError):
-        #     rex = re.compile(b' ([0-9a-f]{8})')
-        #     _data = self.adb.adb_out('service call iphonesubinfo 1', timeout=2)
-        #     if _data and len(_data) > 9:
-        #         plen = int(b''.join(_data[:2]), 16)
-
-        # Time
-        with suppress(TimeoutError):
-            self.REPORT['local_time'] = time.strftime('%Y-%m-%d %H:%M:%S %Z')
-            rtime = self.adb.adb_out(r"date '+%F\ %T\ %Z'", timeout=5)
-            rtime = rtime.replace('\\', '')
-            self.REPORT['device_time'] = rtime.split(self.adb.rmr.decode())[-1]
-
-        # SIM Card
-        with suppress(TimeoutError, Exception):
-            if self.adb.exists('/data/system/SimCard.dat', su=self.su):
-                _simdat = self.adb.adb_out('cat /data/system/SimCard.dat', su=self.su, timeout=5)
-                sims = [
-                    'CurrentSimSerialNumber',
-                    'CurrentSimPhoneNumber',
-                    'CurrentSimOperatorName',
-                    'PreviousSimSerialNumber',
-                    'PreviousSimPhoneNumber']
-                if _simdat:
-                    _simdat = _simdat.split('\n')
-                    for s in sims:
-                        self.REPORT[s] = get_prop(_simdat, s)
-
-        # Accounts
-        with suppress(TimeoutError):
-            _acc = self.adb.adb_out('dumpsys account', timeout=5)
-            self.REPORT['accounts'] = get_accounts(_acc)
+        self.REPORT['permisson'] = self.get_permission()
+
+        # Independent probes run concurrently, results are merged in the listed order
+        probes = [
+            self.probe_build_prop,
+            self.probe_wifi,
+            self.probe_imei,
+            self.probe_time,
+            self.probe_sim,
+            self.probe_accounts,
+        ]
+        # Local time is taken before the probes, and reported even if the device time is not
+        local_time = time.strftime('%Y-%m-%d %H:%M:%S %Z')
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=len(probes))
+        futures = [pool.submit(probe) for probe in probes]
+        concurrent.futures.wait(futures, timeout=self.PROBE_TIMEOUT * 2)
+        pool.shutdown(wait=False)
+        for probe, future in zip(probes, futures):
+            if probe == self.probe_time:
+                self.REPORT['local_time'] = local_time
+            if not future.done():
+                self.logger.debug(f'Probe timed out: {probe.__name__}')
+                continue
+            try:
+                self.REPORT.update(future.result() or {})
+            except Exception as err:
+                self.logger.debug(f'Probe failed: {probe.__name__} > {err}')
 
     @staticmethod
     def clean_name(value):
@@ -182,6 +285,16 @@ class ChainExecution:
                     date_, time_,))
         except Exception:
             self.work_dir = os.path.join(self.base_dir, f'andriller_extraction_{date_}_{time_}')
+        if self.serial:
+            self.work_dir = f'{self.work_dir}_{self.clean_name(self.serial)}'
+        work_dir, n = self.work_dir, 1
+        while True:
+            try:  # reserved atomically, parallel extractions may pick the same name in the same second
+                os.makedirs(self.work_dir)
+                break
+            except FileExistsError:
+                self.work_dir = f'{work_dir}_{n}'
+                n += 1
         self.output_dir = os.path.join(self.base_dir, self.work_dir, self.extract_dir)
         self.logger.debug(f'work_dir:{self.work_dir}')
         self.logger.debug(f'output_dir:{self.output_dir}')
@@ -204,30 +317,70 @@ class ChainExecution:
                 os.path.split(file_remote)[1])
             if remote_size == 0:
                 return None
+            remote_mtime = self.adb.get_mtime(file_path, su=self.su)
+            if self.reuse_previous(file_path, file_remote, file_saveas, remote_size, remote_mtime):
+                self.DataStore.add(file_saveas, file_remote)
+                self.DOWNLOADS.append(file_name)
+                return True
             self.logger.info(f'{file_remote} ({remote_size} bytes)')
-            if self.permisson == self.ROOT:
-                self.adb.pull_file(file_path, file_local)
-                if os.path.exists(file_local):
-                    self.DataStore.add(file_saveas, file_remote)
-                    self.DOWNLOADS.append(file_name)
-                    return True
-            elif self.permisson == self.ROOTSU:
-                for _ in range(100):
-                    file_obj = self.adb.get_file(file_path, su=self.su)
-                    if file_obj:
-                        # remote_size = remote_size if remote_size else len(file_obj)
-                        if len(file_obj) == remote_size:
-                            with open(file_saveas, 'wb') as W:
-                                W.write(file_obj)
-                            self.DataStore.add(file_saveas, file_remote)
-                            self.DOWNLOADS.append(file_name)
-                            return True
-                        time.sleep(0.25)
-                        self.logger.debug(f'Trying again for {file_name} ({len(file_obj)} bytes)')
-                else:
-                    self.logger.warning(f'Failed getting file: {file_name}')
+            with self.slot('transfer'), self.timings.stage('download', file=file_remote, bytes=remote_size):
+                if self.permisson == self.ROOT:
+                    self.adb.pull_file(file_path, file_local)
+                    if os.path.exists(file_local):
+                        self.add_manifest(file_remote, file_name, remote_size, remote_mtime)
+                        self.DataStore.add(file_saveas, file_remote)
+                        self.DOWNLOADS.append(file_name)
+                        return True
+                elif self.permisson == self.ROOTSU:
+                    for _ in range(100):
+                        local_size, local_hash = self.adb.get_file_to(file_path, file_saveas, su=self.su)
+                        if local_size:
+                            if local_size == remote_size:
+                                self.logger.debug(f'{file_name} md5: {local_hash}')
+                                self.add_manifest(file_remote, file_name, remote_size, remote_mtime, local_hash)
+                                self.DataStore.add(file_saveas, file_remote)
+                                self.DOWNLOADS.append(file_name)
+                                return True
+                            time.sleep(0.25)
+                            self.logger.debug(f'Trying again for {file_name} ({local_size} bytes)')
+                    else:
+                        self.logger.warning(f'Failed getting file: {file_name}')
+                        with suppress(OSError):
+                            os.remove(file_saveas)
         return False
 
+    def add_manifest(self, file_remote, file_name, size, mtime, md5=None):
+        self.MANIFEST[file_remote] = {
+            'file': file_name,
+            'size': size,
+            'mtime': mtime,
+            'md5': md5 or utils.get_hash(os.path.join(self.output_dir, file_name)),
+        }
+
+    def reuse_previous(self, file_path, file_remote, file_saveas, remote_size, remote_mtime):
+        """
+        Copies (or hard-links) a file from the previous extraction, if it is unchanged on the device.
+        The file is considered unchanged if size and modified time match, or if remote hash matches.
+        """
+        prev = self.PREVIOUS.get(file_remote)
+        if not prev or prev['size'] != remote_size:
+            return False
+        prev_file = os.path.join(self.previous, self.extract_dir, prev['file'])
+        if not os.path.isfile(prev_file):
+            return False
+        if remote_mtime is None or prev['mtime'] != remote_mtime:
+            if self.adb.get_hash(file_path, su=self.su) != prev['md5']:
+                return False
+        with suppress(FileNotFoundError):
+            os.remove(file_saveas)
+        try:
+            os.link(prev_file, file_saveas)
+        except OSError:
+            shutil.copy2(prev_file, file_saveas)
+        self.logger.info(f'{file_remote} (unchanged, reused)')
+        self.MANIFEST[file_remote] = dict(prev)
+        return True
+
     def do_backup(self, ALL=True, shared=False, backup_name='backup.ab'):
         backup_file = os.path.join(self.work_dir, backup_name)
         cmd = [
@@ -237,64 +390,80 @@ class ChainExecution:
             '-f',
             backup_file,
         ]
-        com = threading.Thread(target=lambda: self.adb(cmd))
-        com.start()
-        if self.updater:
-            messages.msg_do_backup()
-        while com.is_alive():
-            time.sleep(0.5)
-            if os.path.exists(backup_file):
-                _size = os.path.getsize(backup_file)
-                self.update(f'Reading backup: {utils.human_bytes(_size)}', info=False)
+        with self.slot('transfer'), self.timings.stage('backup', file=backup_name) as counters:
+            com = threading.Thread(target=lambda: self.adb(cmd))
+            com.start()
+            if self.updater and hasattr(self.updater, '_root'):
+                from . import messages
+                messages.msg_do_backup()
+            while com.is_alive():
+                time.sleep(0.5)
+                if os.path.exists(backup_file):
+                    _size = os.path.getsize(backup_file)
+                    self.update(f'Reading backup: {utils.human_bytes(_size)}', info=False)
+                    counters['bytes'] = _size
         self.backup = backup_file
 
+    @timed
     def AndroidBackupToTar(self):
         self.update('Unpacking backup...')
-        self.tarfile = self.tools.ab_to_tar(self.backup)
+        self.tarfile = self.backup_tar = self.tools.ab_to_tar(self.backup)
 
     def ExtractFromTar(self, targets=[]):
         self.update('Extracting from backup...')
-        for fn in self.tools.extract_form_tar(
-                self.tarfile,
-                self.output_dir,
-                targets=targets):
-            self.DataStore.add(os.path.join(self.output_dir, fn), fn)
-            self.DOWNLOADS.append(fn)
+        with self.timings.stage('ExtractFromTar', bytes=os.path.getsize(self.tarfile), files=0) as counters:
+            for fn in self.tools.extract_form_tar(
+                    self.tarfile,
+                    self.output_dir,
+                    targets=targets):
+                self.DataStore.add(os.path.join(self.output_dir, fn), fn)
+                self.DOWNLOADS.append(fn)
+                counters['files'] += 1
 
     def get_targets(self):
-        self.targets = [*map(pathlib.PurePath, self.registry.get_posix_links())]
+        names = {self.registry.target_name(link) for link in self.registry.get_posix_links()}
+        self.targets = utils.target_matcher(names)
 
     def in_targets(self, target):
         if not self.targets:
             self.get_targets()
-        target = pathlib.PureWindowsPath(target).as_posix()
-        for f in self.targets:
-            if f.match(target):
-                return True
-        return False
+        target = str(target).replace('\\', '/')
+        return self.targets(self.registry.target_name(target))
 
-    @staticmethod
-    def extract_form_dir(src_dir):
-        src_dir_path = pathlib.Path(src_dir)
-        for fobj in src_dir_path.rglob('**/*'):
-            if fobj.is_file():
-                yield fobj
+    def extract_form_dir(self, src_dir):
+        """
+        Yields target file paths, directories of apps without decoders are not walked.
+        """
+        for file_path in utils.walk_files(src_dir, prune=self.registry.is_foreign_package):
+            if self.in_targets(file_path):
+                yield file_path
 
+    @timed
     def ExtractFromDir(self):
+        """
+        Copies targets into the output directory (keeping relative paths) using a thread pool.
+        """
         self.update('Extracting from directory...')
-        src_dir_path = pathlib.Path(self.src_dir)
-        for fobj in self.extract_form_dir(self.src_dir):
-            fn = fobj.relative_to(src_dir_path)
-            if self.in_targets(fn.name):
-                self.logger.info(fn.name)
-                shutil.copy2(fobj, os.path.join(self.output_dir, fn.name))
-                self.DOWNLOADS.append(os.path.basename(fn))
+        with concurrent.futures.ThreadPoolExecutor() as pool:
+            copies = []
+            for file_path in self.extract_form_dir(self.src_dir):
+                fn = pathlib.PurePath(os.path.relpath(file_path, self.src_dir)).as_posix()
+                self.logger.info(fn)
+                dst = os.path.join(self.output_dir, fn)
+                copies.append((fn, pool.submit(utils.copy_file, file_path, dst, link=self.link_files)))
+            for fn, copy in copies:
+                try:
+                    copy.result()
+                    self.DOWNLOADS.append(fn)
+                except OSError as err:
+                    self.logger.warning(f'Failed copying: {fn} > {err}')
 
     def enumerate_files(self, target_dir='/'):
         FILES = []
         for f in self.adb_iter(f'find {target_dir} -type f -readable'):
             FILES.append(f)
 
+    @timed
     def DataAcquisition(self, run_backup=False, shared=False):
         self.update('Acquiring data...')
         if not run_backup and self.ROOT in self.permisson:
@@ -302,14 +471,71 @@ class ChainExecution:
                 self.update('Acquiring shared storage...')
                 self.do_backup(ALL=False, shared=True, backup_name='shared.ab')
             self.update('Acquiring databases via root...')
-            for file_path in self.registry.get_root_links():
-                self.download_file(file_path)
+            if self.pipeline:
+                self.acquire_pipelined()
+            else:
+                for file_path in self.registry.get_root_links():
+                    self.download_file(file_path)
         elif run_backup or self.permisson == self.USER:
             self.do_backup(shared=shared)
             if self.backup and os.path.getsize(self.backup) <= 2 ** 10:
                 self.logger.error('Android backup failed - too small.')
                 self.backup = False
 
+    def acquire_pipelined(self):
+        """
+        Downloads files grouped by decoder; as soon as a decoder's target, sidecars and extras
+        have been attempted, the decoder is queued, so decoding overlaps the transfer of the rest.
+        Targets with a name shared by other groups are left to `DataDecoding`, as they may be overwritten.
+        """
+        groups = self.registry.get_root_link_groups()
+        names = collections.Counter(os.path.basename(links[0]) for links in groups.values())
+        attempted = set()
+        for deco_class, links in groups.items():
+            for file_path in links:
+                if file_path not in attempted:
+                    attempted.add(file_path)
+                    self.download_file(file_path)
+            file_name = os.path.basename(links[0])
+            if names[file_name] == 1 and file_name in self.DOWNLOADS \
+                    and deco_class in self.registry.decoders_target(file_name):
+                self.logger.debug(f'Queued {file_name} for {deco_class.__name__}')
+                self.submit_decoding(file_name, deco_class)
+
+    def get_decode_pool(self):
+        """
+        Thread pool which runs the decoders, each holding a scheduler 'decode' slot;
+        with jobs > 1 the decoding itself runs in a process pool. Its workers are spawned, not forked,
+        as the pool starts while other threads run (a forked child may inherit a lock held by one of them).
+        Python 3.6 has no `mp_context`, so there the decoding stays in the thread pool.
+        """
+        if not self.decode_pool:
+            self.decode_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs)
+            if self.jobs > 1 and sys.version_info >= (3, 7):
+                self.process_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.jobs, mp_context=multiprocessing.get_context('spawn'))
+        return self.decode_pool
+
+    def close_decode_pool(self):
+        for pool in [self.decode_pool, self.process_pool]:
+            if pool:
+                pool.shutdown()
+        self.decode_pool = self.process_pool = None
+
+    def run_decoder(self, file_path, deco_class, title=None):
+        with self.slot('decode'):
+            if self.process_pool:
+                return self.process_pool.submit(
+                    decode_target, self.work_dir, file_path, deco_class, cache=self.cache, title=title).result()
+            return decode_target(self.work_dir, file_path, deco_class, cache=self.cache, title=title)
+
+    def submit_decoding(self, file_name, deco_class, title=None):
+        key = (file_name, deco_class)
+        if key not in self.FUTURES:
+            file_path = os.path.join(self.output_dir, file_name)
+            self.FUTURES[key] = self.get_decode_pool().submit(self.run_decoder, file_path, deco_class, title)
+        return self.FUTURES[key]
+
     def DataExtraction(self):
         self.update('Extracting data from source...')
         if self.backup:
@@ -321,34 +547,94 @@ class ChainExecution:
         # if self.DataStore and self.DataStore.members:
         #     pass  # TODO!
 
+    @timed
     def DecodeShared(self):
         try:
             if self.backup or (self.do_shared and self.backup):
                 self.update('Decoding shared filesystem...')
                 deco = decoders.SharedFilesystemDecoder(self.work_dir, self.backup)
-                self.DECODED.append([deco.report_html(), f'{deco.title} ({len(deco.DATA)})'])
+                self.DECODED.append([deco.report_html(), f'{deco.title} ({deco.total})'])
         except Exception as err:
             logger.exception(f'Shared decoder error: {err}')
 
+    def decoding_jobs(self):
+        jobs = []
+        for file_name in filter(None, self.DOWNLOADS):
+            if self.registry.has_target(file_name):
+                for deco_class in self.registry.decoders_target(file_name):
+                    jobs.append((file_name, deco_class))
+        return jobs
+
+    @staticmethod
+    def job_titles(jobs):
+        """
+        Report titles for decoders that run on several inputs (eg: a database of each user),
+        suffixed with the input's directory, so their reports and sheets do not collide.
+        """
+        counts = collections.Counter(deco_class for _, deco_class in jobs)
+        return {
+            (file_name, deco_class): f'{deco_class.title} ({os.path.dirname(file_name) or file_name})'
+            for file_name, deco_class in jobs if counts[deco_class] > 1}
+
+    @timed
     def DataDecoding(self):
         self.update('Decoding extracted data...')
         self.logger.debug(self.DOWNLOADS)
         workbook = self.get_master_workbook()
-        for file_name in filter(None, self.DOWNLOADS):
-            if self.registry.has_target(file_name):
-                for deco_class in self.registry.decoders_target(file_name):
-                    file_path = os.path.join(self.output_dir, file_name)
-                    try:
-                        self.logger.info(f'Decoding {file_name} using {deco_class.__name__}')
-                        deco = deco_class(self.work_dir, file_path)
-                        if not deco.template_name:
-                            continue
-                        self.DECODED.append([deco.report_html(), f'{deco.title} ({len(deco.DATA)})'])
-                        deco.report_xlsx(workbook=workbook)
-                    except Exception as e:
-                        logger.error(f'Decoding error for `{os.path.basename(file_name)}`: {e}')
-                        logger.exception(str(e))
+        jobs = self.decoding_jobs()
+        if self.FUTURES or (self.jobs > 1 and len(jobs) > 1):
+            return self.decode_parallel(jobs, workbook)
+        titles = self.job_titles(jobs)
+        for file_name, deco_class in jobs:
+            file_path = os.path.join(self.output_dir, file_name)
+            title = titles.get((file_name, deco_class))
+            try:
+                self.logger.info(f'Decoding {file_name} using {deco_class.__name__}')
+                with self.slot('decode'):
+                    result = decode_target(self.work_dir, file_path, deco_class, cache=self.cache, title=title)
+                    self.add_decoded(result, workbook)
+            except Exception as e:
+                logger.error(f'Decoding error for `{os.path.basename(file_name)}`: {e}')
+                logger.exception(str(e))
+
+    def add_decoded(self, result, workbook):
+        if not result:
+            return
+        html_report, deco, records = result
+        self.timings.extend(records)
+        self.DECODED.append([html_report, f'{deco.title} ({deco.total})'])
+        with self.timings.stage(f'{type(deco).__name__}.report_xlsx', rows=deco.total):
+            deco.report_xlsx(workbook=workbook)
+
+    def decode_parallel(self, jobs, workbook):
+        """
+        Runs decoders (and their HTML reports) in the decoding pool, largest inputs first.
+        Decoders already queued during the acquisition are not run again.
+        Results are assembled in the same order as the serial decoding.
+        """
+        def input_size(job):
+            with suppress(OSError):
+                return os.path.getsize(os.path.join(self.output_dir, job[0]))
+            return 0
 
+        self.logger.info(f'Decoding {len(jobs)} targets using {self.jobs} processes')
+        try:
+            titles = self.job_titles(jobs)
+            for file_name, deco_class in sorted(jobs, key=input_size, reverse=True):
+                self.submit_decoding(file_name, deco_class, titles.get((file_name, deco_class)))
+            for file_name, deco_class in jobs:
+                try:
+                    result = self.FUTURES[(file_name, deco_class)].result()
+                    self.logger.info(f'Decoded {file_name} using {deco_class.__name__}')
+                    self.add_decoded(result, workbook)
+                except Exception as e:
+                    logger.error(f'Decoding error for `{os.path.basename(file_name)}`: {e}')
+                    logger.exception(str(e))
+        finally:
+            self.close_decode_pool()
+            self.FUTURES = {}
+
+    @timed
     def GenerateHtmlReport(self, open_html=True):
         self.update('Generating HTML report...')
         env = engines.get_engine()
@@ -370,6 +656,7 @@ class ChainExecution:
         self.WB.write_header(self.summary_sheet, ['Extraction Summary'])
         return self.WB
 
+    @timed
     def GenerateXlsxReport(self):
         self.update('Generating XLSX report...')
         for row, summary in enumerate(self.DECODED, start=1):
@@ -377,6 +664,46 @@ class ChainExecution:
         self.WB.close()
 
 
+# -----------------------------------------------------------------------------
+def decode_target(work_dir, file_path, deco_class, cache=None, title=None):
+    """
+    Decodes a file and writes its HTML report, returns the report path, the decoder (with DATA)
+    and the timing records. Defined on the module level, so it can be run in a worker process.
+    cache (DecodeCache): optional, decoded rows are reused from (or saved to) the cache.
+    title (str): optional, report title instead of the decoder's (names the HTML file and the sheet).
+    Rows of `streamed` decoders are cached as the HTML report reads them, the XLSX report reads them from the cache.
+    """
+    timer = timings.Timings()
+    name = deco_class.__name__
+    if not deco_class.template_name:
+        return None
+    deco = deco_class(work_dir, file_path, stage=True)
+    key = data = None
+    if cache:
+        with timer.stage(f'{name}.cache'):
+            key = cache.key(deco)
+            data = cache.get_total(key) if deco_class.streamed else cache.get(key)
+    if data is None:
+        with timer.stage(f'{name}.main', file=os.path.basename(file_path)) as counters:
+            with suppress(OSError):
+                counters['bytes'] = os.path.getsize(file_path)
+            deco = deco_class(work_dir, file_path)
+            counters['rows'] = deco.total
+        if key and not deco_class.streamed:
+            cache.put(key, deco.DATA)
+    elif deco_class.streamed:
+        deco.row_count = data
+    else:
+        deco.DATA = data
+    if key and deco_class.streamed:
+        deco.rows_cache = (cache, key)
+    if title:
+        deco.title = title
+    with timer.stage(f'{name}.report_html', rows=deco.total):
+        html_report = deco.report_html()
+    return html_report, deco, timer.records
+
+
 # -----------------------------------------------------------------------------
 class DecodingError(Exception):
     pass
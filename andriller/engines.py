@@ -1,8 +1,11 @@
 import os
 import re
 import jinja2
+import functools
 import xlsxwriter
+from appdirs import AppDirs
 from . import config
+from . import __package_name__
 
 _paragraph_re = re.compile(r'(?:\r\n|\r|\n){2,}')
 
@@ -17,35 +20,92 @@ def nl2br(eval_ctx, value):
     return result
 
 
+def get_bytecode_cache():
+    cache_dir = os.path.join(AppDirs(appname=__package_name__).user_cache_dir, 'templates')
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return None
+    return jinja2.FileSystemBytecodeCache(cache_dir)
+
+
+@functools.lru_cache(maxsize=None)
 def get_engine():
+    """
+    Returns the process-wide environment, compiled templates are kept in memory,
+    and their bytecode is cached on disk for the next processes.
+    """
     file_loader = jinja2.FileSystemLoader(os.path.join(config.CODEPATH, 'templates'))
-    engine = jinja2.Environment(loader=file_loader)
+    engine = jinja2.Environment(loader=file_loader, bytecode_cache=get_bytecode_cache(), auto_reload=False)
     engine.filters['nl2br'] = nl2br
     return engine
 
 
 class Workbook:
+    """
+    XLSX workbook written with constant memory: each row is flushed to disk as soon as the next
+    one is written, so rows must be written in order per sheet.
+    """
     EXT = 'xlsx'
+    MAX_ROWS = 1048576  # per sheet, including the header
+    MAX_NAME = 31  # sheet name length
+    INVALID_NAME = re.compile(r'[\[\]:*?/\\]')  # characters not allowed in sheet names
 
     def __init__(self, work_dir, name):
-        params = {'strings_to_urls': False, 'strings_to_formulas': False}
+        params = {'strings_to_urls': False, 'strings_to_formulas': False, 'constant_memory': True}
+        self.max_rows = self.MAX_ROWS
         self.header = {'bold': True, 'bg_color': "#72A0C1"}
         self.file_name = f'{name}.{self.EXT}'
         self.work_dir = work_dir
         self.file_path = os.path.join(self.work_dir, self.file_name)
         self.workbook = xlsxwriter.Workbook(self.file_path, params)
+        self.sheet_names = set()
 
     def add_sheet(self, sheet):
         return self.workbook.add_worksheet(sheet)
 
+    def unique_name(self, name):
+        """
+        Returns `name` made valid as a sheet name, and numbered if a sheet already uses it.
+        """
+        name, n = self.INVALID_NAME.sub('_', name), 1
+        while self.sheet_name(name, n).lower() in self.sheet_names:
+            n += 1
+        return name if n == 1 else self.sheet_name(name, n)
+
     def write_header(self, sheet, titles, row=0, col=0):
         sheet.write_row(row, col, titles, self.workbook.add_format(self.header))
 
+    def sheet_name(self, name, part=1):
+        suffix = f' ({part})' if part > 1 else ''
+        return f'{name[:self.MAX_NAME - len(suffix)]}{suffix}'
+
+    def write_rows(self, name, titles, rows):
+        """
+        Writes a header and rows to a new sheet, very large sheets continue on new
+        sheets `name (2)`, `name (3)`.. once a sheet is full. Returns the number of rows written.
+        """
+        sheet, row, part, count = None, self.max_rows, 0, 0
+        name = self.unique_name(name)
+        for count, values in enumerate(rows, start=1):
+            if row == self.max_rows:
+                part += 1
+                sheet = self.add_sheet(self.sheet_name(name, part))
+                self.write_header(sheet, titles)
+                row = 1
+            sheet.write_row(row, 0, values)
+            row += 1
+        if sheet is None:
+            part = 1
+            self.write_header(self.add_sheet(self.sheet_name(name)), titles)
+        self.sheet_names.update(self.sheet_name(name, n).lower() for n in range(1, part + 1))
+        return count
+
     def close(self):
         self.workbook.close()
 
 
 def get_head_foot():
-    c = config.Config()
+    c = config.get_config()
     fields = ['custom_header', 'custom_footer']
     return {_: c(_) for _ in fields}
@@ -57,7 +57,7 @@ class BaseWindow:
         logo_ = os.path.join(config.CODEPATH, 'res', 'logo.gif')
         self.img_logo = tk.PhotoImage(master=root, file=logo_)
         self.style_ttk = ttk.Style()
-        self.conf = config.Config()
+        self.conf = config.get_config()
         if self.conf('theme'):
             self.style_ttk.theme_use(self.conf('theme'))
 
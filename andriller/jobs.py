@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import multiprocessing
+from contextlib import closing
+from . import cli
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of extraction jobs, shared by worker processes on the same machine.
+    Job status is one of: queued|running|done|failed
+    """
+    KINDS = {'.tar': 'tar', '.ab': 'ab'}
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self.connect()) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                source TEXT NOT NULL UNIQUE,
+                output TEXT NOT NULL,
+                options TEXT NOT NULL DEFAULT '{}',
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                error TEXT,
+                work_dir TEXT,
+                worker INTEGER,
+                created REAL,
+                updated REAL)''')
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add(self, kind, source, output, max_attempts=3, **options):
+        """
+        Queues a source, returns the job id (None if the source is already queued).
+        """
+        now = time.time()
+        with closing(self.connect()) as conn:
+            cur = conn.execute(
+                'INSERT OR IGNORE INTO jobs (kind, source, output, options, max_attempts, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (kind, os.path.abspath(source), output, json.dumps(options), max_attempts, now, now))
+            return cur.lastrowid if cur.rowcount else None
+
+    def claim(self, worker=None):
+        """
+        Marks the oldest queued job as running and returns it, or None when the queue is empty.
+        """
+        conn = self.connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            job = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if job:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, updated = ? WHERE id = ?",
+                    (worker, time.time(), job['id']))
+            conn.execute('COMMIT')
+            return self.get(job['id']) if job else None
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        with closing(self.connect()) as conn:
+            return dict(conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+    def finish(self, job_id, work_dir):
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', work_dir = ?, error = NULL, updated = ? WHERE id = ?",
+                (work_dir, time.time(), job_id))
+
+    def fail(self, job_id, error):
+        """
+        Queues the job again, or marks it as failed once it has run out of attempts.
+        """
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                "error = ?, updated = ? WHERE id = ?",
+                (str(error), time.time(), job_id))
+
+    def recover(self):
+        """
+        Queues again the jobs left running by workers that did not finish (eg: the machine restarted).
+        """
+        with closing(self.connect()) as conn:
+            return conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+
+    def jobs(self, status=None):
+        with closing(self.connect()) as conn:
+            if status:
+                rows = conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY id', (status,))
+            else:
+                rows = conn.execute('SELECT * FROM jobs ORDER BY id')
+            return [dict(row) for row in rows]
+
+    def pending(self):
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def scan(self, watch_dir, output, settle=10, **options):
+        """
+        Queues new .tar/.ab files and directories found in `watch_dir`, that were not modified
+        in the last `settle` seconds (so files still being copied in are not picked up).
+        Returns a list of the new job ids.
+        """
+        added = []
+        for entry in sorted(os.scandir(watch_dir), key=lambda e: e.name):
+            if entry.is_dir():
+                kind = 'dir'
+            else:
+                kind = self.KINDS.get(os.path.splitext(entry.name)[1].lower())
+            if not kind or time.time() - entry.stat().st_mtime < settle:
+                continue
+            job_id = self.add(kind, entry.path, output, **options)
+            if job_id:
+                added.append(job_id)
+        return added
+
+
+def run_job(queue, job, worker=None):
+    """
+    Runs one claimed job with `cli.extract_source`, records its result in the queue.
+    """
+    options = json.loads(job['options'])
+    progress = cli.JsonProgress(job['source'])
+    progress.emit('start', kind=job['kind'], job=job['id'], attempt=job['attempts'], worker=worker)
+    try:
+        os.makedirs(job['output'], exist_ok=True)
+        work_dir = cli.extract_source(job['kind'], job['source'], job['output'], progress=progress, **options)
+    except Exception as err:
+        logger.exception(f"Job {job['id']} failed for {job['source']}: {err}")
+        progress.emit('error', job=job['id'], message=str(err))
+        queue.fail(job['id'], err)
+        return False
+    progress.emit('done', job=job['id'], work_dir=work_dir)
+    queue.finish(job['id'], work_dir)
+    return True
+
+
+def worker(queue_path, worker=None, wait=False, poll=5):
+    """
+    Worker process loop: claims and runs jobs until the queue is empty (or forever if `wait`).
+    """
+    queue = JobQueue(queue_path)
+    while True:
+        job = queue.claim(worker=worker)
+        if job:
+            run_job(queue, job, worker=worker)
+        elif wait:
+            time.sleep(poll)
+        else:
+            return
+
+
+def serve(queue_path, workers=None, watch_dir=None, output=None, poll=5, **options):
+    """
+    Runs `workers` processes over the queue. Without `watch_dir` it returns once all jobs are processed,
+    otherwise new sources dropped into `watch_dir` keep being queued until interrupted.
+    """
+    queue = JobQueue(queue_path)
+    if queue.recover():
+        logger.info('Re-queued jobs left running by a previous run.')
+    wait = bool(watch_dir)
+    if wait:
+        queue.scan(watch_dir, output, **options)
+    procs = [
+        multiprocessing.Process(target=worker, args=(queue_path, n, wait, poll))
+        for n in range(workers or os.cpu_count() or 1)]
+    for proc in procs:
+        proc.start()
+    try:
+        while wait:
+            time.sleep(poll)
+            queue.scan(watch_dir, output, **options)
+    except KeyboardInterrupt:
+        logger.info('Stopping workers...')
+        for proc in procs:
+            proc.terminate()
+    for proc in procs:
+        proc.join()
+    return queue.jobs(status='failed')
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser(
+        'jobs',
+        help='Queue of headless extractions, processed by a pool of worker processes.')
+    parser.add_argument('--queue', default='andriller_jobs.sqlite', help='Queue database file.')
+    actions = parser.add_subparsers(dest='action')
+    actions.required = True  # add_subparsers(required=...) needs Python 3.7
+
+    add = actions.add_parser('add', help='Queue sources for extraction.')
+    add.add_argument('--tar', action='append', default=[], help='TAR file to parse (repeatable).')
+    add.add_argument('--ab', action='append', default=[], help='AB file to parse (repeatable).')
+    add.add_argument('--dir', action='append', default=[], help='Directory to parse (repeatable).')
+    add.add_argument('--out', required=True, help='Output directory.')
+    add.add_argument('--retries', type=int, default=2, help='Times to retry a failed job.')
+
+    run = actions.add_parser('run', help='Process queued jobs with worker processes.')
+    run.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    run.add_argument('--watch', help='Directory to watch for new .tar/.ab files and directories (runs until interrupted).')
+    run.add_argument('--out', help='Output directory for sources found in the watched directory.')
+    run.add_argument('--poll', type=int, default=5, help='Seconds between checks for new jobs.')
+
+    actions.add_parser('status', help='Print the status of queued jobs as JSON lines.')
+    return parser
+
+
+def main(args):
+    """
+    Runs `jobs` for the parsed arguments, returns the exit code.
+    """
+    queue = JobQueue(args.queue)
+    if args.action == 'add':
+        for kind in ['tar', 'ab', 'dir']:
+            for source in getattr(args, kind):
+                queue.add(kind, source, args.out, max_attempts=args.retries + 1)
+    elif args.action == 'run':
+        if args.watch and not args.out:
+            logger.error('--out is required with --watch')
+            return 1
+        failed = serve(args.queue, workers=args.workers, watch_dir=args.watch, output=args.out, poll=args.poll)
+        return int(bool(failed))
+    elif args.action == 'status':
+        for job in queue.jobs():
+            sys.stdout.write(f'{json.dumps(job)}\n')
+    return 0
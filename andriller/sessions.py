@@ -0,0 +1,103 @@
+import os
+import logging
+import threading
+import contextlib
+import concurrent.futures
+from . import driller
+from . import adb_conn
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    Caps the use of resources shared between parallel extractions.
+    transfers (int): maximum concurrent USB transfers (file pulls and backups).
+    decoders (int): maximum concurrent decoders, defaults to the number of CPUs.
+    """
+    def __init__(self, transfers=2, decoders=None):
+        self.limits = {
+            'transfer': transfers,
+            'decode': decoders or os.cpu_count() or 1,
+        }
+        self.semaphores = {k: threading.BoundedSemaphore(v) for k, v in self.limits.items()}
+
+    @contextlib.contextmanager
+    def slot(self, resource):
+        with self.semaphores[resource]:
+            yield
+
+
+class SessionManager:
+    """
+    Runs independent USB extractions for every connected device concurrently.
+    Each device gets its own `ADBConn` (bound by serial) and its own work directory.
+    """
+    READY = 'device'
+
+    def __init__(self, base_dir, scheduler=None, **kwargs):
+        """
+        base_dir (str|Path): directory where per-device work directories are created.
+        scheduler (Scheduler): shared resource limits, a default one is used if not passed.
+        run_backup (bool): use AB method even if rooted.
+        shared (bool): extract shared storage.
+        """
+        self.base_dir = base_dir
+        self.scheduler = scheduler or Scheduler()
+        self.run_backup = kwargs.get('run_backup', False)
+        self.shared = kwargs.get('shared', False)
+        self.logger = kwargs.get('logger', logger)
+        self.adb = kwargs.get('adb') or adb_conn.ADBConn()
+
+    def enumerate(self):
+        """
+        Returns serials of all devices which are ready for the extraction.
+        """
+        serials = []
+        for serial, status in self.adb.devices():
+            if status == self.READY:
+                serials.append(serial)
+            else:
+                self.logger.warning(f'Device {serial} is {status}, skipping.')
+        return serials
+
+    def extract(self, serial):
+        drill = driller.ChainExecution(
+            self.base_dir,
+            use_adb=True,
+            serial=serial,
+            scheduler=self.scheduler,
+            do_shared=self.shared,
+            logger=self.logger.getChild(serial))
+        drill.InitialAdbRead()
+        drill.CreateWorkDir()
+        drill.DataAcquisition(run_backup=self.run_backup, shared=self.shared)
+        drill.DataExtraction()
+        drill.DecodeShared()
+        drill.DataDecoding()
+        drill.GenerateHtmlReport(open_html=False)
+        drill.GenerateXlsxReport()
+        drill.CleanUp()
+        return drill.work_dir
+
+    def run(self, serials=None):
+        """
+        Extracts all (or the given) devices in parallel.
+        Returns a dict of {serial: work_dir or exception}.
+        """
+        serials = serials or self.enumerate()
+        results = {}
+        if not serials:
+            self.logger.warning('No devices detected!')
+            return results
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(serials)) as pool:
+            futures = {pool.submit(self.extract, serial): serial for serial in serials}
+            for future in concurrent.futures.as_completed(futures):
+                serial = futures[future]
+                try:
+                    results[serial] = future.result()
+                    self.logger.info(f'Finished {serial}: {results[serial]}')
+                except Exception as err:
+                    self.logger.exception(f'Extraction failed for {serial}: {err}')
+                    results[serial] = err
+        return results
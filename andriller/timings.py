@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Timings:
+    """
+    Collects timed stages with counters (bytes, rows, files, ...),
+    which can be saved as a JSON summary or as a Chrome trace (chrome://tracing).
+    """
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name, **counters):
+        """
+        Times the enclosed block, yields a dict of counters which may be updated inside the block.
+        """
+        start = time.time()
+        try:
+            yield counters
+        finally:
+            self.add(name, start, time.time() - start, **counters)
+
+    def add(self, name, start, duration, **counters):
+        record = {
+            'name': name,
+            'start': start,
+            'duration': duration,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            **counters,
+        }
+        with self.lock:
+            self.records.append(record)
+
+    def extend(self, records):
+        with self.lock:
+            self.records.extend(records)
+
+    @staticmethod
+    def peak_rss():
+        """
+        Peak resident memory of this process in bytes, if available.
+        """
+        if resource:
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss if sys.platform == 'darwin' else rss * 1024
+
+    def summary(self):
+        totals = {}
+        for r in self.records:
+            total = totals.setdefault(r['name'], {'count': 0, 'duration': 0})
+            total['count'] += 1
+            total['duration'] += r['duration']
+            for k in ('bytes', 'rows', 'files'):
+                if k in r:
+                    total[k] = total.get(k, 0) + r[k]
+        return {
+            'peak_rss': self.peak_rss(),
+            'totals': totals,
+            'stages': self.records,
+        }
+
+    def dump(self, file_path):
+        with open(file_path, 'w') as W:
+            json.dump(self.summary(), W, indent=2, default=str)
+
+    def dump_trace(self, file_path):
+        origin = min((r['start'] for r in self.records), default=0)
+        events = [{
+            'name': r['name'],
+            'ph': 'X',
+            'ts': int((r['start'] - origin) * 1e6),
+            'dur': int(r['duration'] * 1e6),
+            'pid': r['pid'],
+            'tid': r['tid'],
+            'args': {k: v for k, v in r.items() if k not in ('name', 'start', 'duration', 'pid', 'tid')},
+        } for r in self.records]
+        with open(file_path, 'w') as W:
+            json.dump({'traceEvents': events}, W, default=str)
@@ -3,6 +3,7 @@ import re
 import json
 import uuid
 import zlib
+import shutil
 import string
 import hashlib
 import logging
@@ -16,15 +17,6 @@ import contextlib
 logger = logging.getLogger(__name__)
 
 
-def placebo(*args, **kwargs):
-    """
-    Decorator that decorates nothing (used to replace real ones where functionality is not possible).
-    """
-    def decorate(function):
-        return function
-    return decorate
-
-
 def threaded(method):
     """
     Send the function to be executed on a separate thread rather than the main thread.
@@ -109,19 +101,76 @@ def get_koi(payload, keys: list) -> dict:
     return result if set(result.values()) else {}
 
 
-def hash_file(file_path, algo='md5', buff=2**20):
+def get_hash(file_path, algo='md5', buff=2**20):
     hasher = hashlib.new(algo)
-    with open(f'{file_path}.{algo}', 'w') as W:
-        with open(file_path, 'rb') as R:
-            while True:
-                d = R.read(buff)
-                if not d:
-                    break
-                hasher.update(d)
-        W.write(hasher.hexdigest())
+    with open(file_path, 'rb') as R:
+        while True:
+            d = R.read(buff)
+            if not d:
+                break
+            hasher.update(d)
     return hasher.hexdigest()
 
 
+def hash_file(file_path, algo='md5', buff=2**20):
+    digest = get_hash(file_path, algo=algo, buff=buff)
+    with open(f'{file_path}.{algo}', 'w') as W:
+        W.write(digest)
+    return digest
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Translates a target glob (only `*` is special) to a regex, where `*` does not cross `/`.
+    """
+    return re.escape(pattern).replace(r'\*', '[^/]*')
+
+
+def target_matcher(targets: list):
+    """
+    Compiles a list of target paths into a single matching function.
+    Static paths are looked up in a set, globbed paths are matched with one combined regex.
+    """
+    static = {t for t in targets if '*' not in t}
+    globs = [glob_to_regex(t) for t in targets if '*' in t]
+    rex = re.compile(f"^(?:{'|'.join(globs)})$") if globs else None
+
+    def match(name: str) -> bool:
+        return name in static or bool(rex and rex.match(name))
+    return match
+
+
+def walk_files(src_dir, prune=None):
+    """
+    Yields file paths under a directory (using `os.scandir`).
+    prune (callable): optional, takes a directory path, if True the directory is not descended into.
+    """
+    stack = [src_dir]
+    while stack:
+        with contextlib.suppress(OSError), os.scandir(stack.pop()) as entries:
+            dirs = []
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir(follow_symlinks=False):
+                    if not (prune and prune(entry.path)):
+                        dirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path
+            stack.extend(reversed(dirs))
+
+
+def copy_file(src, dst, link=False):
+    """
+    Copies a file with metadata, creating parent directories.
+    If link is True, hard-links the file instead when both paths are on the same filesystem.
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if link and os.stat(src).st_dev == os.stat(os.path.dirname(dst)).st_dev:
+        with contextlib.suppress(OSError):
+            os.link(src, dst)
+            return dst
+    return shutil.copy2(src, dst)
+
+
 # -----------------------------------------------------------------------------
 class DrillerTools:
     AB_MAGIC = b'ANDROID BACKUP'
@@ -166,19 +215,20 @@ class DrillerTools:
     @staticmethod
     def extract_form_tar(src_file, dst_dir, targets: list = None, full=False):
         """
-        Yields tar file names, uses a list of targets or a full extraction
+        Yields tar file names, uses a list of targets or a full extraction.
+        The tar is read in a single streaming pass, only matching members are written.
         """
-        if targets is None:
-            targets = []
-        with tarfile.open(src_file) as tar:
-            for tar_name in tar.getnames():
+        match = target_matcher(targets or [])
+        with tarfile.open(src_file, 'r|*') as tar:
+            for member in tar:
+                if not (full or match(member.name)):
+                    continue
                 try:
-                    tar.extract(tar_name, dst_dir)
-                    logger.debug(tar_name)
-                    if tar_name in targets or full:
-                        yield tar_name
+                    tar.extract(member, dst_dir)
+                    logger.debug(member.name)
+                    yield member.name
                 except Exception as err:
-                    logger.warning(f'Failed extracting: {tar_name} > {err}')
+                    logger.warning(f'Failed extracting: {member.name} > {err}')
 
     @staticmethod
     def extract_tar_members(src_file, dst_dir, match='.+?'):
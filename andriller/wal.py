@@ -0,0 +1,148 @@
+"""
+Read-only support for SQLite databases with a write-ahead log (`-wal` file).
+The committed frames of the log are applied to a copy of the database pages in memory,
+so the extracted files are never modified, and need not be copied with their `-shm`.
+Before Python 3.11 (no `Connection.deserialize`) the image is written to a temporary file
+(a full copy of the database on disk) and opened from there, so callers cap the database size.
+"""
+import os
+import sys
+import array
+import struct
+import sqlite3
+import logging
+import pathlib
+import tempfile
+from contextlib import suppress
+
+logger = logging.getLogger(__name__)
+
+WAL_MAGIC = 0x377f0682  # the low bit set means big-endian checksums
+WAL_HEADER = struct.Struct('>IIIIIIII')
+FRAME_HEADER = struct.Struct('>IIIIII')
+MASK = 0xFFFFFFFF
+DESERIALIZE = hasattr(sqlite3.Connection, 'deserialize')
+
+
+def checksum(data, s0=0, s1=0, big_endian=True):
+    """
+    WAL checksum of `data` (a multiple of 8 bytes), continued from (s0, s1).
+    """
+    words = array.array('I', data)
+    if big_endian != (sys.byteorder == 'big'):
+        words.byteswap()
+    it = iter(words)
+    for x0, x1 in zip(it, it):
+        s0 = (s0 + x0 + s1) & MASK
+        s1 = (s1 + x1 + s0) & MASK
+    return s0, s1
+
+
+def read_frames(wal_file):
+    """
+    Returns (page_size, db_pages, {page_number: page_data}) of the frames up to the last
+    valid commit in the log, or None if the log has no committed frames.
+    """
+    with open(wal_file, 'rb') as R:
+        header = R.read(WAL_HEADER.size)
+        if len(header) < WAL_HEADER.size:
+            return None
+        magic, version, page_size, ckpt, salt1, salt2, c0, c1 = WAL_HEADER.unpack(header)
+        if magic & ~1 != WAL_MAGIC:
+            logger.warning(f'Not a valid WAL file: {wal_file}')
+            return None
+        big_endian = bool(magic & 1)
+        s0, s1 = checksum(header[:24], big_endian=big_endian)
+        if (s0, s1) != (c0, c1):
+            logger.warning(f'WAL header checksum mismatch: {wal_file}')
+            return None
+        pages, committed, db_pages = {}, {}, 0
+        while True:
+            frame = R.read(FRAME_HEADER.size + page_size)
+            if len(frame) < FRAME_HEADER.size + page_size:
+                break
+            page_no, commit_size, f_salt1, f_salt2, f0, f1 = FRAME_HEADER.unpack_from(frame)
+            if (f_salt1, f_salt2) != (salt1, salt2):
+                break
+            s0, s1 = checksum(frame[:8], s0, s1, big_endian)
+            s0, s1 = checksum(frame[FRAME_HEADER.size:], s0, s1, big_endian)
+            if (s0, s1) != (f0, f1):
+                break
+            pages[page_no] = frame[FRAME_HEADER.size:]
+            if commit_size:
+                committed.update(pages)
+                pages.clear()
+                db_pages = commit_size
+    if not db_pages:
+        return None
+    return page_size, db_pages, committed
+
+
+def read_image(db_file, wal_file=None):
+    """
+    Returns the database image (bytearray) with the committed WAL frames applied,
+    or None if there is no WAL file or it has nothing to apply.
+    """
+    wal_file = wal_file or f'{db_file}-wal'
+    if not os.path.isfile(wal_file) or not os.path.getsize(wal_file):
+        return None
+    frames = read_frames(wal_file)
+    if not frames:
+        return None
+    page_size, db_pages, pages = frames
+    with open(db_file, 'rb') as R:
+        image = bytearray(R.read(page_size * db_pages))
+    image.extend(bytes(page_size * db_pages - len(image)))
+    for page_no, data in pages.items():
+        if page_no <= db_pages:
+            offset = (page_no - 1) * page_size
+            image[offset:offset + page_size] = data
+    image[18:20] = b'\x01\x01'  # legacy (rollback journal) format, the image has no WAL
+    return image
+
+
+class SnapshotConnection(sqlite3.Connection):
+    """
+    Connection to a temporary copy of a database image, the copy is removed when closed.
+    """
+    path = None
+
+    def close(self):
+        super().close()
+        if self.path:
+            with suppress(OSError):
+                os.remove(self.path)
+            self.path = None
+
+
+def snapshot(image, **kwargs):
+    """
+    Writes the image to a temporary file, returns a read-only connection to it.
+    The copy takes as much disk space as the database, it is removed when the connection is closed.
+    """
+    fd, path = tempfile.mkstemp(suffix='.db')
+    try:
+        with os.fdopen(fd, 'wb') as W:
+            W.write(image)
+        uri = f'{pathlib.Path(path).as_uri()}?mode=ro&immutable=1'
+        conn = sqlite3.connect(uri, uri=True, factory=SnapshotConnection, **kwargs)
+    except Exception:
+        os.remove(path)
+        raise
+    conn.path = path
+    return conn
+
+
+def connect(db_file, **kwargs):
+    """
+    Returns a connection to the database image with its WAL applied (in memory,
+    or a temporary snapshot before Python 3.11), or None if there is no WAL to apply.
+    """
+    image = read_image(db_file)
+    if image is None:
+        return None
+    if not DESERIALIZE:
+        return snapshot(image, **kwargs)
+    conn = sqlite3.connect(':memory:', **kwargs)
+    conn.deserialize(image)
+    return conn
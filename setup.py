@@ -14,6 +14,7 @@ with open(reme, "rt", encoding="utf-8") as f:
 setup(
     name=__package_name__,
     scripts=["andriller-gui.py"],
+    entry_points={"console_scripts": ["andriller=andriller:run"]},
     version=__version__,
     description="Andriller CE | Android Forensic Tools",
     author="Denis Sazonov",
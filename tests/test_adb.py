@@ -1,4 +1,7 @@
+import io
 import sys
+import hashlib
+import threading
 import pytest
 import tempfile
 import subprocess
@@ -6,6 +9,7 @@ from unittest import mock
 from andriller import adb_conn
 
 fake_adb = tempfile.NamedTemporaryFile()
+ADB_TIMEOUT = adb_conn.ADBConn.TIMEOUT
 
 
 @pytest.fixture
@@ -13,7 +17,7 @@ def ADB(mocker):
     mocker.patch('andriller.adb_conn.ADBConn.kill')
     mocker.patch('andriller.adb_conn.ADBConn._opt_use_capture', return_value=True)
     with mock.patch('andriller.adb_conn.ADBConn._get_adb_bin', return_value=fake_adb.name):
-        with mock.patch('andriller.adb_conn.ADBConn._adb_has_exec', return_value=True):
+        with mock.patch('andriller.adb_conn.ADBConn._adb_has_exec', return_value=False):
             adb = adb_conn.ADBConn()
     adb_cmd = adb.adb.__func__
     setattr(adb, 'adb', lambda *args, **kwargs: adb_cmd(adb, *args, **kwargs))
@@ -41,7 +45,7 @@ def ADB_win(mocker):
     mocker.patch('andriller.adb_conn.ADBConn._opt_use_capture', return_value=True)
     with mock.patch('sys.platform', return_value='win32'):
         with mock.patch('andriller.adb_conn.ADBConn._get_adb_bin', return_value=fake_adb.name):
-            with mock.patch('andriller.adb_conn.ADBConn._adb_has_exec', return_value=True):
+            with mock.patch('andriller.adb_conn.ADBConn._adb_has_exec', return_value=False):
                 adb = adb_conn.ADBConn()
     return adb
 
@@ -67,7 +71,7 @@ def test_adb_simple(ADB, mocker):
     res = ADB('hello')
     assert res == 'lala'
     mock_run.assert_called_with([fake_adb.name, 'hello'],
-        capture_output=True, shell=False, startupinfo=None)
+        capture_output=True, shell=False, startupinfo=None, timeout=ADB_TIMEOUT)
 
 
 def test_adb_simple_su(ADB, mocker):
@@ -77,7 +81,7 @@ def test_adb_simple_su(ADB, mocker):
     res = ADB('hello', su=True)
     assert res == 'lala'
     mock_run.assert_called_with([fake_adb.name, 'su -c', 'hello'],
-        capture_output=True, shell=False, startupinfo=None)
+        capture_output=True, shell=False, startupinfo=None, timeout=ADB_TIMEOUT)
 
 
 def test_adb_binary(ADB, mocker):
@@ -87,7 +91,7 @@ def test_adb_binary(ADB, mocker):
     res = ADB('hello', binary=True)
     assert res == b'lala'
     mock_run.assert_called_with([fake_adb.name, 'hello'],
-        capture_output=True, shell=False, startupinfo=None)
+        capture_output=True, shell=False, startupinfo=None, timeout=ADB_TIMEOUT)
 
 
 def test_adb_out(ADB, mocker):
@@ -97,7 +101,7 @@ def test_adb_out(ADB, mocker):
     res = ADB.adb_out('id', binary=False)
     assert res == 'uid(1000)'
     mock_run.assert_called_with([fake_adb.name, 'shell', 'id'],
-        capture_output=True, shell=False, startupinfo=None)
+        capture_output=True, shell=False, startupinfo=None, timeout=ADB_TIMEOUT)
 
 
 def test_adb_out_alt(ADB_alt, mocker):
@@ -107,7 +111,7 @@ def test_adb_out_alt(ADB_alt, mocker):
     res = ADB_alt.adb_out('id', binary=True)
     assert res == b'uid(1000)'
     mock_run.assert_called_with([fake_adb.name, 'shell', 'id'],
-        stdout=subprocess.PIPE, shell=False, startupinfo=None)
+        stdout=subprocess.PIPE, shell=False, startupinfo=None, timeout=ADB_TIMEOUT)
 
 
 def test_adb_out_win(ADB_win, mocker):
@@ -126,4 +130,96 @@ def test_adb_out_uses_exec(ADB, mocker):
     res = ADB.adb_out('id', binary=False)
     assert res == 'uid(1000)'
     mock_run.assert_called_with([fake_adb.name, 'exec-out', 'id'],
-        capture_output=True, shell=False, startupinfo=None)
+        capture_output=True, shell=False, startupinfo=None, timeout=ADB_TIMEOUT)
+
+
+@pytest.mark.parametrize('chunks, rmr, result', [
+    ([b'ab\r', b'\ncd'], b'\r\n', b'ab\ncd'),
+    ([b'ab\r\r', b'\ncd\r'], b'\r\r\n', b'ab\ncd\r'),
+    ([b'a\r', b'\r', b'\r\n'], b'\r\r\n', b'a\r\n'),
+    ([b'\r\n\r\n'], b'\r\n', b'\n\n'),
+])
+def test_iter_unstrip(ADB_alt, chunks, rmr, result):
+    ADB_alt.rmr = rmr
+    assert b''.join(ADB_alt.iter_unstrip(chunks)) == result
+    assert ADB_alt.unstrip(b''.join(chunks)) == result
+
+
+def test_get_file_to(ADB_alt, mocker, tmp_path):
+    data = b'SQLite\r\n' * 1000
+    process = mock.Mock(stdout=io.BytesIO(data), returncode=0)
+    mock_popen = mocker.patch('andriller.adb_conn.subprocess.Popen', return_value=process)
+
+    dst = tmp_path / 'file.db'
+    size, digest = ADB_alt.get_file_to('/some/file.db', dst, buffer=7)
+    expected = data.replace(b'\r\n', b'\n')
+    assert size == len(expected)
+    assert digest == hashlib.md5(expected).hexdigest()
+    assert dst.read_bytes() == expected
+    assert mock_popen.call_args[0][0] == [fake_adb.name, 'shell', 'cat', '/some/file.db']
+
+
+def test_get_file_to_fails(ADB, mocker, tmp_path):
+    process = mock.Mock(stdout=io.BytesIO(b'partial'), returncode=1)
+    mocker.patch('andriller.adb_conn.subprocess.Popen', return_value=process)
+    assert ADB.get_file_to('/some/file.db', tmp_path / 'file.db') == (0, None)
+
+    process = mock.Mock(stdout=mock.Mock(read=mock.Mock(side_effect=OSError)))
+    process.poll.return_value = None
+    mocker.patch('andriller.adb_conn.subprocess.Popen', return_value=process)
+    with pytest.raises(OSError):
+        ADB.get_file_to('/some/file.db', tmp_path / 'file.db')
+    process.kill.assert_called_once()
+    process.stdout.close.assert_called_once()
+
+
+def test_get_file_to_timeout(ADB, mocker, tmp_path):
+    killed = threading.Event()
+    process = mock.Mock(returncode=-9)
+    process.kill.side_effect = killed.set
+    process.stdout.read.side_effect = lambda size: killed.wait(5) and b''
+    mocker.patch('andriller.adb_conn.subprocess.Popen', return_value=process)
+    with pytest.raises(TimeoutError):
+        ADB.get_file_to('/some/file.db', tmp_path / 'file.db', timeout=0.05)
+    assert killed.is_set()
+
+
+def test_adb_serial(ADB, mocker):
+    ADB.serial = 'ABC123'
+    output = mock.Mock(stdout=b'uid(1000)', returncode=0)
+    mock_run = mocker.patch('andriller.adb_conn.subprocess.run', return_value=output)
+
+    ADB.adb_out('id')
+    mock_run.assert_called_with([fake_adb.name, '-s', 'ABC123', 'shell', 'id'],
+        capture_output=True, shell=False, startupinfo=None, timeout=ADB_TIMEOUT)
+
+
+def test_exec_out_check_serial(mocker):
+    mocker.patch('andriller.adb_conn.ADBConn.kill')
+    mocker.patch('andriller.adb_conn.ADBConn._opt_use_capture', return_value=True)
+    mocker.patch('andriller.adb_conn.ADBConn._get_adb_bin', return_value=fake_adb.name)
+    mock_run = mocker.patch('andriller.adb_conn.subprocess.run', return_value=mock.Mock(returncode=0))
+    adb = adb_conn.ADBConn(serial='AAA')
+    assert adb._is_adb_out_post_v5 is True
+    assert mock_run.call_args[0][0] == [fake_adb.name, '-s', 'AAA', 'exec-out', 'id']
+    assert adb._get_adb_cmd('cat /x', False, True) == ['-s', 'AAA', 'exec-out', 'cat', '/x']
+
+
+def test_devices(ADB, mocker):
+    ADB.serial = 'BBB'
+    output = mock.Mock(stdout=b'List of devices attached\nAAA\tdevice\nBBB\tunauthorized\n', returncode=0)
+    mock_run = mocker.patch('andriller.adb_conn.subprocess.run', return_value=output)
+
+    assert ADB.devices() == [['AAA', 'device'], ['BBB', 'unauthorized']]
+    mock_run.assert_called_with([fake_adb.name, 'devices'],
+        capture_output=True, shell=False, startupinfo=None, timeout=5)
+    assert ADB.device() == ['BBB', 'unauthorized']
+
+
+def test_adb_timeout(ADB, mocker):
+    mock_run = mocker.patch('andriller.adb_conn.subprocess.run',
+        side_effect=subprocess.TimeoutExpired('adb', 5))
+
+    with pytest.raises(TimeoutError):
+        ADB.adb_out('dumpsys wifi', timeout=5)
+    assert mock_run.call_args[1]['timeout'] == 5
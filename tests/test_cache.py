@@ -0,0 +1,62 @@
+import os
+import shutil
+from unittest import mock
+from andriller import cache
+from andriller import driller
+from andriller import decoders
+from .test_decoders import msgstore
+
+
+def test_decode_cache_lru(tmp_path):
+    store = cache.DecodeCache(str(tmp_path / 'cache'), max_size=1)
+    assert store.get('missing') is None
+    assert store.put('a', [{'x': 1, 'y': b'\x00'}]) is True
+    assert os.listdir(store.cache_dir) == []  # over max_size, evicted
+    store.max_size = 2 ** 20
+    store.put('a', [{'x': 1}])
+    store.put('b', [{'x': 2}])
+    os.utime(store.entry('a'), (0, 0))
+    store.max_size = os.path.getsize(store.entry('b'))
+    store.put('b', [{'x': 2}])
+    assert store.get('a') is None
+    assert store.get('b') == [{'x': 2}]
+
+
+def test_decode_target_cached(tmp_path):
+    os.environ['HOME'] = str(tmp_path)
+    src = os.path.join(os.path.dirname(__file__), 'data', 'data', 'com.android.providers.contacts', 'db')
+    for name in ['calllog.db', 'calllog.db-wal']:
+        shutil.copy(os.path.join(src, name), tmp_path)
+    db = tmp_path / 'calllog.db'
+    store = cache.DecodeCache(str(tmp_path / 'cache'))
+    deco_class = decoders.AndroidOneCallsDecoder
+    first = driller.decode_target(str(tmp_path), str(db), deco_class, cache=store)
+    assert len(first[1].DATA) > 0
+    with mock.patch.object(deco_class, 'main', side_effect=AssertionError):
+        second = driller.decode_target(str(tmp_path), str(db), deco_class, cache=store)
+    assert second[1].DATA == first[1].DATA
+    assert 'AndroidOneCallsDecoder.main' not in {r['name'] for r in second[2]}
+    # A changed sidecar changes the key
+    key = store.key(first[1])
+    with open(tmp_path / 'calllog.db-wal', 'ab') as W:
+        W.write(b'\x00')
+    assert store.key(deco_class(str(tmp_path), str(db), stage=True)) != key
+
+
+def test_decode_target_streamed_cached(tmp_path, msgstore):
+    os.environ['HOME'] = str(tmp_path)
+    store = cache.DecodeCache(str(tmp_path / 'cache'))
+    deco_class = decoders.WhatsAppMessagesDecoder
+    first = driller.decode_target(str(tmp_path), msgstore, deco_class, cache=store)
+    with open(tmp_path / first[0], 'rb') as R:
+        report = R.read()
+    with mock.patch.object(deco_class, 'iter_data', side_effect=AssertionError):
+        rows = [*first[1].rows()]  # as read by the XLSX report
+        with mock.patch.object(deco_class, 'main', side_effect=AssertionError):
+            second = driller.decode_target(str(tmp_path), msgstore, deco_class, cache=store)
+        assert [*second[1].rows()] == rows
+    assert len(rows) == second[1].total == first[1].total
+    with open(tmp_path / second[0], 'rb') as R:
+        assert R.read() == report
+    os.remove(store.rows_entry(store.key(first[1])))
+    assert [*second[1].rows()] == rows  # evicted, decoded again
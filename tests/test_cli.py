@@ -0,0 +1,41 @@
+import io
+import os
+import sys
+import json
+import argparse
+import subprocess
+from andriller import cli
+
+
+def parse(*argv):
+    parser = argparse.ArgumentParser()
+    cli.add_parser(parser.add_subparsers(dest='command'))
+    return parser.parse_args(argv)
+
+
+def test_no_tkinter():
+    code = "import sys, andriller.cli, andriller.driller; assert 'tkinter' not in sys.modules"
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+def test_json_progress():
+    stream = io.StringIO()
+    progress = cli.JsonProgress('x.tar', stream=stream)
+    progress.set('Extracting...')
+    record = json.loads(stream.getvalue())
+    assert record['event'] == 'status'
+    assert record['source'] == 'x.tar'
+    assert record['message'] == 'Extracting...'
+
+
+def test_extract_dir(tmp_path, capsys):
+    os.environ['HOME'] = str(tmp_path)
+    src_dir = os.path.join(os.path.dirname(__file__), 'data')
+    args = parse('extract', '--dir', src_dir, '--out', str(tmp_path / 'out'), '--tar', str(tmp_path / 'nope.tar'))
+    assert cli.main(args) == 1
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    events = {(r['source'], r['event']) for r in records}
+    assert (src_dir, 'done') in events
+    assert (str(tmp_path / 'nope.tar'), 'error') in events
+    work_dir = next(r['work_dir'] for r in records if r['event'] == 'done')
+    assert 'REPORT.html' in os.listdir(work_dir)
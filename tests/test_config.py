@@ -49,3 +49,12 @@ def test_check_latest_version(conf, version, result):
     with mock.patch('andriller.config.requests.get', return_value=response_obj):
         conf.check_latest_version()
         assert conf.update_available == result
+
+
+def test_get_config_shared(conf):
+    shared = config.get_config()
+    assert config.get_config() is shared
+    conf.update_conf(**{conf.NS: {'time_zone': 'UTC+02:00'}})
+    fresh = config.get_config()
+    assert fresh is not shared
+    assert fresh('time_zone') == 'UTC+02:00'
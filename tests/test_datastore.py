@@ -0,0 +1,24 @@
+import os
+import json
+import hashlib
+from andriller import datastore
+
+
+def test_content_store(tmp_path):
+    data = tmp_path / 'data'
+    data.mkdir()
+    (data / 'a.db').write_bytes(b'same')
+    (data / 'b.db').write_bytes(b'same')
+    (data / 'c.db').write_bytes(b'other')
+
+    store = datastore.ContentStore(str(tmp_path / 'DataStore'))
+    digests = [store.add(str(data / f), f'/remote/{f}') for f in ['a.db', 'b.db', 'c.db']]
+    store.close()
+    assert digests[0] == digests[1] == hashlib.sha256(b'same').hexdigest()
+    assert len(os.listdir(store.objects)) == 2
+    assert os.path.samefile(store.object_path(digests[2]), data / 'c.db')
+
+    with open(store.name) as R:
+        index = json.load(R)
+    assert index['/remote/c.db'] == {'hash': digests[2], 'size': 5}
+    assert datastore.ContentStore(store.path).index == index
@@ -1,5 +1,7 @@
 import os
+import sys
 import pytest
+import sqlite3
 import hashlib
 import tempfile
 from andriller.classes import AndroidDecoder, DecoderError
@@ -108,6 +110,24 @@ def test_where(Deco, params, result):
     assert Deco.where(params) == result
 
 
+@pytest.mark.parametrize('params, result', [
+    ({'!status': 6, 'status': [1, 2]}, ("status!=? AND status IN (?,?)", ['6', '1', '2'])),
+    ({'type': ['lol', 'rolf'], '!status': [100]}, ("type IN (?,?) AND status NOT IN (?)", ['lol', 'rolf', '100'])),
+    ({'status': 1}, ("status=?", ['1'])),
+    ({}, ('', [])),
+])
+def test_where_params(Deco, params, result):
+    assert Deco.where_params(params) == result
+
+
+def test_where_params_query(DecoFile):
+    table = 'locksettings'
+    rows = DecoFile.sql_table_rows(table, columns=['name'])
+    names = [r[0] for r in rows[:2]]
+    assert [r[0] for r in DecoFile.sql_table_rows(table, columns=['name'], where={'name': names})] == names
+    assert len(DecoFile.sql_table_rows(table, where={'!name': names})) == len(rows) - 2
+
+
 @pytest.mark.parametrize('data, result', [
     (0, '00:00:00'),
     (1, '00:00:01'),
@@ -188,3 +208,150 @@ def test_decoder_data_types(Deco):
 ])
 def test_parse_number(Deco, data, result):
     assert Deco.parse_number(data) == result
+
+
+def test_get_neighbour_sibling(Deco, tmp_path):
+    (tmp_path / 'db').mkdir()
+    (tmp_path / 'sp').mkdir()
+    (tmp_path / 'sp' / 'prefs.xml').write_text('<map/>')
+    Deco.input_file = str(tmp_path / 'db' / 'data.db')
+    assert Deco.get_neighbour('prefs.xml') == str(tmp_path / 'sp' / 'prefs.xml')
+    assert Deco.get_neighbour('missing.xml') is False
+
+
+def test_connection_reused(DecoFile):
+    with DecoFile as dec:
+        conn = dec.connect()
+        assert dec.get_sql_tables()
+        assert dec.get_cursor().connection is conn
+        assert conn.execute('PRAGMA query_only').fetchone()[0] == 1
+    assert DecoFile._conn is None
+    with pytest.raises(Exception):
+        conn.execute('SELECT 1')
+
+
+def test_sql_table_iter(DecoFile):
+    DecoFile.batch_size = 1
+    table = DecoFile.get_sql_tables()[0]
+    rows = DecoFile.sql_table_iter(table)
+    assert not isinstance(rows, list)
+    assert [*rows] == DecoFile.sql_table_as_dict(table)
+
+
+def test_report_xlsx_rows(Deco, tmp_path):
+    Deco.work_dir = str(tmp_path)
+    rows = ({'name': f'n{i}'} for i in range(3))
+    report = Deco.report_xlsx(rows=rows)
+    assert os.path.isfile(tmp_path / report)
+    assert next(rows, None) is None
+
+
+def test_report_xlsx_spill(Deco, tmp_path):
+    from andriller import engines
+    Deco.work_dir = str(tmp_path)
+    Deco.title = 'A very long decoder title for sheets'
+    workbook = engines.Workbook(str(tmp_path), 'REPORT')
+    workbook.max_rows = 3
+    Deco.report_xlsx(workbook=workbook, rows=({'name': i} for i in range(5)))
+    names = [ws.get_name() for ws in workbook.workbook.worksheets()]
+    assert names == ['A very long decoder title for s', 'A very long decoder title f (2)', 'A very long decoder title f (3)']
+    assert all(len(n) <= 31 for n in names)
+    workbook.close()
+
+
+def test_report_xlsx_same_title(Deco, tmp_path):
+    from andriller import engines
+    Deco.work_dir = str(tmp_path)
+    Deco.title = 'Calls (user/10)'
+    workbook = engines.Workbook(str(tmp_path), 'REPORT')
+    for _ in range(2):
+        Deco.report_xlsx(workbook=workbook, rows=({'name': i} for i in range(2)))
+    names = [ws.get_name() for ws in workbook.workbook.worksheets()]
+    assert names == ['Calls (user_10)', 'Calls (user_10) (2)']
+    workbook.close()
+
+
+def test_time_column(DecoTZ):
+    rows = [{'date': 1555711540123}, {'date': 0}, {'date': None}]
+    DecoTZ.time_column(rows, 'date', target='time')
+    assert [r['time'] for r in rows] == ['2019-04-19 17:05:40 UTC-05:00', None, None]
+    assert DecoTZ.time_converter('webkit')(13199992732000000) == '2019-04-17 16:38:52 UTC-05:00'
+    assert DecoTZ.webkit_to_time(13199992732000000) == '2019-04-17 16:38:52 UTC-05:00'
+
+
+@pytest.mark.parametrize('resume_fetch', [True, False])
+def test_iter_rows_resumes_on_bad_utf8(Deco, tmp_path, resume_fetch):
+    import sqlite3
+    db = tmp_path / 'bad.db'
+    with sqlite3.connect(db) as conn:
+        conn.execute('CREATE TABLE t (n INTEGER, s TEXT)')
+        conn.executemany('INSERT INTO t VALUES (?, ?)', [(n, f'ok {n}') for n in range(5)])
+        conn.execute("INSERT INTO t VALUES (5, CAST(x'6261640aff' AS TEXT))")
+        conn.execute("INSERT INTO t VALUES (6, 'ok 6')")
+    Deco.input_file = str(db)
+    if resume_fetch and sys.version_info < (3, 11):
+        pytest.skip('needs Python 3.11+')
+    Deco.batch_size = 2
+    Deco.resume_fetch = resume_fetch
+    statements = []
+    Deco.connect().set_trace_callback(statements.append)
+    rows = Deco.sql_table_as_dict('t', order_by='n', order='ASC')
+    assert [r['s'] for r in rows] == ['ok 0', 'ok 1', 'ok 2', 'ok 3', 'ok 4', 'bad\n', 'ok 6']
+    assert len(statements) == 1
+    with pytest.raises(sqlite3.OperationalError):
+        Deco.sql_table_rows('t', cursor_kw={'text_factory': str})
+
+
+@pytest.mark.parametrize('deserialize', [True, False])
+def test_connect_wal_image(DecoFile, mocker, deserialize):
+    from andriller import wal
+    if deserialize and not wal.DESERIALIZE:
+        pytest.skip('needs Python 3.11+')
+    mocker.patch.object(wal, 'DESERIALIZE', deserialize)
+    connect = mocker.spy(wal, 'connect')
+    with DecoFile as dec:
+        assert len(dec.sql_table_as_dict('locksettings')) == 12
+    assert isinstance(connect.spy_return, sqlite3.Connection)
+
+
+@pytest.mark.parametrize('wal_image_max', [2 ** 26, 0])
+def test_connect_no_shm(Deco, tmp_path, wal_image_max):
+    import shutil
+    src = os.path.join(os.path.dirname(__file__), 'data', 'data', 'com.android.providers.contacts', 'db')
+    shutil.copy(os.path.join(src, 'calllog.db'), tmp_path)
+    (tmp_path / 'calllog.db-wal').write_bytes(b'')
+    Deco.input_file = str(tmp_path / 'calllog.db')
+    Deco.wal_image_max = wal_image_max
+    with Deco as dec:
+        assert dec.get_sql_tables()
+    assert sorted(os.listdir(tmp_path)) == ['calllog.db', 'calllog.db-wal']
+
+
+def test_connect_wal_over_max(DecoFile, caplog):
+    DecoFile.wal_image_max = 0
+    with DecoFile as dec:
+        dec.get_sql_tables()
+    assert 'WAL not applied' in caplog.text
+
+
+def test_iter_rows_text_factory_per_query(Deco, tmp_path):
+    import sqlite3
+    db = tmp_path / 'text.db'
+    with sqlite3.connect(db) as conn:
+        conn.execute('CREATE TABLE t (s TEXT)')
+        conn.executemany('INSERT INTO t VALUES (?)', [(f'v{n}',) for n in range(4)])
+    Deco.input_file = str(db)
+    Deco.batch_size = 1
+    values = []
+    for row in Deco.sql_table_iter('t', cursor_kw={'text_factory': bytes}):
+        assert Deco.get_sql_tables() == ('t',)
+        values.append(row['s'])
+    assert values == [b'v0', b'v1', b'v2', b'v3']
+
+
+def test_pickle_with_extras(Deco):
+    import pickle
+    Deco.add_extra('sp', 'prefs.xml')
+    clone = pickle.loads(pickle.dumps(Deco))
+    assert clone.input_file == Deco.input_file
+    assert clone.EXTRAS == []
@@ -25,3 +25,130 @@ def test_calls_one():
     assert i['type'] == 'Dialled'
     assert i['number'] == '+441234567890'
     assert i['date'].startswith('2020-05-07')
+
+
+@pytest.fixture
+def msgstore(tmp_path):
+    import sqlite3
+    app_dir = tmp_path / 'com.whatsapp'
+    (app_dir / 'db').mkdir(parents=True)
+    (app_dir / 'sp').mkdir()
+    (app_dir / 'sp' / 'com.whatsapp_preferences.xml').write_text(
+        '<?xml version="1.0" encoding="utf-8"?>\n<map><string name="registration_jid">447700900000</string></map>')
+    db = app_dir / 'db' / 'msgstore.db'
+    with sqlite3.connect(db) as conn:
+        conn.executescript('''
+            CREATE TABLE messages (_id INTEGER PRIMARY KEY AUTOINCREMENT, key_remote_jid TEXT NOT NULL,
+                key_from_me INTEGER, key_id TEXT NOT NULL, status INTEGER, data TEXT, timestamp INTEGER,
+                media_url TEXT, media_mime_type TEXT, media_caption TEXT, latitude REAL, longitude REAL,
+                thumb_image TEXT, remote_resource TEXT, raw_data BLOB);
+            CREATE TABLE chat_list (_id INTEGER PRIMARY KEY AUTOINCREMENT, key_remote_jid TEXT UNIQUE, subject TEXT);
+            CREATE TABLE group_participants (_id INTEGER PRIMARY KEY AUTOINCREMENT, gjid TEXT NOT NULL,
+                jid TEXT NOT NULL, admin INTEGER);
+            CREATE TABLE message_thumbnails (thumbnail BLOB, timestamp INTEGER, key_remote_jid TEXT NOT NULL,
+                key_from_me INTEGER, key_id TEXT NOT NULL);
+        ''')
+        conn.executemany('INSERT INTO chat_list (key_remote_jid, subject) VALUES (?, ?)', [
+            ('447700900001@s.whatsapp.net', None),
+            ('447700900002-1500000000@g.us', 'Family'),
+            ('447700900003-1500000001@g.us', ''),
+        ])
+        conn.executemany('INSERT INTO group_participants (gjid, jid) VALUES (?, ?)', [
+            ('447700900003-1500000001@g.us', '447700900005@s.whatsapp.net'),
+            ('447700900002-1500000000@g.us', '447700900003@s.whatsapp.net'),
+            ('447700900003-1500000001@g.us', ''),
+            ('447700900002-1500000000@g.us', ''),
+            ('447700900002-1500000000@g.us', '447700900002@s.whatsapp.net'),
+            ('447700900003-1500000001@g.us', '447700900004@s.whatsapp.net'),
+        ])
+        conn.execute("INSERT INTO message_thumbnails (thumbnail, key_remote_jid, key_id) VALUES (?, ?, ?)",
+            (b'\x89PNG', 'status@broadcast', 'K5'))
+        conn.executemany(
+            'INSERT INTO messages (key_remote_jid, key_from_me, key_id, status, data, timestamp, remote_resource, raw_data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [
+                ('-1', 0, '-1', -1, None, 0, None, None),
+                ('447700900001@s.whatsapp.net', 0, 'K1', 0, 'Hi', 1555711540123, None, None),
+                ('447700900001@s.whatsapp.net', 1, 'K2', 4, 'Hello', 1555711541123, None, b'\x00\x01'),
+                ('447700900002-1500000000@g.us', 0, 'K3', 0, 'Group hi', 1555711542123, '447700900003@s.whatsapp.net', None),
+                ('447700900003-1500000001@g.us', 1, 'K4', 4, None, 1555711543123, None, None),
+                ('status@broadcast', 0, 'K5', 0, 'Status', 1555711544123, '447700900004@s.whatsapp.net', None),
+                ('447700900001@s.whatsapp.net', 0, 'K6', 6, 'Hidden', 1555711545123, None, None),
+            ])
+    return str(db)
+
+
+def test_whatsapp_messages(msgstore):
+    deco = decoders.WhatsAppMessagesDecoder(os.path.dirname(msgstore), msgstore)
+    rows = deco.rows()
+    assert deco.DATA == [] and not isinstance(rows, list)
+    rows = [*rows]
+    assert deco.total == len(rows)
+    data = {i['key_id']: i for i in rows}
+    assert [i['key_id'] for i in rows] == ['K5', 'K4', 'K3', 'K2', 'K1']
+    assert data['K1']['sender'] == '+447700900001'
+    assert data['K1']['recipients'] == ['+447700900000']
+    assert data['K1']['chat'] == '+447700900001'
+    assert data['K1']['timestamp'] == '2019-04-19 22:05:40 UTC'
+    assert data['K1']['type'] == 'Inbox'
+    assert data['K2']['sender'] == '+447700900000'
+    assert data['K2']['raw_data'] == 'AAE='
+    assert data['K2']['type'] == 'Sent'
+    assert data['K3']['sender'] == '+447700900003'
+    assert data['K3']['chat'] == 'Family'
+    assert data['K3']['recipients'] == ['+447700900003', '+447700900000', '+447700900002']
+    assert data['K4']['chat'] == '+447700900003-1500000001'
+    assert data['K4']['recipients'] == ['+447700900005', '+447700900000', '+447700900004']
+    assert data['K4']['x_message'] == ''
+    assert data['K5']['sender'] == '+447700900004'
+    assert data['K5']['recipients'] == ['+status']
+    assert data['K5']['chat'] == 'broadcast'
+    assert data['K5']['raw_data'] == 'iVBORw=='
+    assert set(data['K1']) == {
+        '_id', 'key_remote_jid', 'key_from_me', 'key_id', 'status', 'data', 'timestamp', 'media_url',
+        'media_mime_type', 'media_caption', 'latitude', 'longitude', 'thumb_image', 'remote_resource', 'raw_data',
+        'sender', 'recipients', 'x_recipients', 'x_message', 'type', 'chat'}
+
+
+@pytest.fixture
+def threads_db(tmp_path):
+    import json
+    import sqlite3
+    db = tmp_path / 'threads_db2'
+    pic = json.dumps([{'url': 'sml.jpg'}, {'url': 'lrg.jpg'}])
+    with sqlite3.connect(db) as conn:
+        conn.executescript('''
+            CREATE TABLE thread_users (user_key TEXT, name TEXT, username TEXT, profile_pic_square TEXT);
+            CREATE TABLE thread_participants (thread_key TEXT, user_key TEXT);
+            CREATE TABLE messages (msg_id TEXT, thread_key TEXT, text TEXT, sender TEXT, timestamp_ms INTEGER,
+                msg_type INTEGER, attachments TEXT, shares TEXT, sticker_id TEXT);
+        ''')
+        conn.executemany('INSERT INTO thread_users VALUES (?, ?, ?, ?)', [
+            ('FACEBOOK:1', 'Ann', 'ann', pic),
+            ('FACEBOOK:2', 'Bob', 'bob', None),
+        ])
+        conn.executemany('INSERT INTO thread_participants VALUES (?, ?)', [
+            ('ONE:1:2', 'FACEBOOK:1'),
+            ('ONE:1:2', 'FACEBOOK:2'),
+        ])
+        conn.executemany('INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+            (f'm{n}', 'ONE:1:2', f'text {n}' if n % 3 else None,
+             json.dumps({'name': 'Bob' if n % 2 else 'Ann', 'user_key': f'FACEBOOK:{n % 2 + 1}'}),
+             1555711540123 + n, n % 10, None, None, None) for n in range(30)
+        ])
+    return str(db)
+
+
+def test_facebook_messages(threads_db):
+    deco = decoders.FacebookMessagesDecoder(os.path.dirname(threads_db), threads_db)
+    deco.batch_size = 4
+    rows = [*deco.rows()]
+    assert deco.DATA == []
+    assert deco.total == len(rows) == 6
+    assert [i['msg_id'] for i in rows] == ['m29', 'm20', 'm19', 'm10', 'm9', 'm0']
+    assert rows[-1]['x_text'] == '<Media content>'
+    assert rows[1]['sender'] == 'Ann' and rows[1]['sender_info']['img_lrg'] == 'lrg.jpg'
+    assert rows[1]['recipients'] == [{}]
+    assert rows[1]['timestamp'] == '2019-04-19 22:05:40 UTC'
+    report = deco.report_html()
+    with open(os.path.join(os.path.dirname(threads_db), report), encoding='UTF-8') as R:
+        assert '<p>Total: 6</p>' in R.read()
@@ -1,6 +1,12 @@
 import os
+import json
+import shutil
+import time
 import tempfile
-from andriller import driller
+import threading
+import concurrent.futures
+from unittest import mock
+from andriller import driller, sessions
 
 
 def test_parse_dir():
@@ -28,3 +34,277 @@ def test_parse_dir():
         assert 'REPORT.xlsx' in _dir_cont
         assert 'DataStore.tar' in _dir_cont
         assert 'data' in _dir_cont
+        assert 'timings.json' in _dir_cont
+        with open(os.path.join(_dir, 'timings.json')) as R:
+            stages = json.load(R)['totals']
+        assert {'ExtractFromDir', 'DataDecoding', 'AndroidOneCallsDecoder.main', 'CleanUp.hash'} <= set(stages)
+
+
+def test_download_reuses_previous(tmp_path):
+    prev_dir = tmp_path / 'previous'
+    (prev_dir / 'data').mkdir(parents=True)
+    (prev_dir / 'data' / 'wa.db').write_bytes(b'12345')
+    remote = '/data/data/com.whatsapp/databases/wa.db'
+    manifest = {remote: {'file': 'wa.db', 'size': 5, 'mtime': 1600000000, 'md5': '827ccb0eea8a706c4c34a16891f84e7b'}}
+    (prev_dir / 'manifest.json').write_text(json.dumps(manifest))
+
+    drill = driller.ChainExecution(str(tmp_path), previous=str(prev_dir))
+    drill.adb = mock.Mock()
+    drill.adb.exists.return_value = remote
+    drill.adb.get_size.return_value = 5
+    drill.adb.get_mtime.return_value = 1600000000
+    drill.su, drill.permisson = True, drill.ROOTSU
+    drill.REPORT = {'serial': 'AAA', 'permisson': drill.ROOTSU}
+    drill.CreateWorkDir()
+
+    assert drill.download_file(remote) is True
+    drill.adb.get_file_to.assert_not_called()
+    assert open(os.path.join(drill.output_dir, 'wa.db'), 'rb').read() == b'12345'
+    assert drill.MANIFEST[remote] == manifest[remote]
+
+    drill.adb.get_mtime.return_value = 1700000000
+    drill.adb.get_hash.return_value = 'ffff'
+    drill.adb.get_file_to.return_value = (5, 'ffff')
+    assert drill.download_file(remote) is True
+    drill.adb.get_file_to.assert_called()
+    assert drill.MANIFEST[remote]['mtime'] == 1700000000
+
+
+def test_initial_adb_read_concurrent(tmp_path):
+    outputs = {
+        'id': 'uid=0(root)',
+        'cat /system/build.prop': 'ro.product.manufacturer=ACME\nro.product.model=Phone 1',
+        'dumpsys wifi': 'mWifiInfo SSID: x, MAC: 02:00:00:00:00:00, Supplicant',
+        'dumpsys iphonesubinfo': '',
+        "date '+%F\\ %T\\ %Z'": '2020-01-01\\ 10:00:00\\ UTC',
+        'dumpsys account': 'Account {name=me@example.com, type=com.google}',
+    }
+
+    def adb_out(cmd, **kwargs):
+        time.sleep(0.2)
+        return outputs.get(cmd, '')
+
+    drill = driller.ChainExecution(str(tmp_path))
+    drill.adb = mock.Mock(rmr=b'\r\n')
+    drill.adb.device.return_value = ['AAA', 'device']
+    drill.adb.adb_out.side_effect = adb_out
+    drill.adb.exists.return_value = None
+    start = time.time()
+    drill.InitialAdbRead()
+    assert time.time() - start < 1
+    assert drill.REPORT['permisson'] == drill.ROOT
+    assert drill.REPORT['ro.product.model'] == 'Phone 1'
+    assert drill.REPORT['wifi mac'] == '02:00:00:00:00:00'
+    assert drill.REPORT['device_time'] == '2020-01-01 10:00:00 UTC'
+    assert drill.REPORT['accounts'] == [('com.google', 'me@example.com')]
+    assert [*drill.REPORT][:4] == ['serial', 'status', 'permisson', 'ro.product.manufacturer']
+    assert [*drill.REPORT].index('local_time') == [*drill.REPORT].index('device_time') - 1
+
+    outputs["date '+%F\\ %T\\ %Z'"] = None
+    drill.REPORT = {}
+    drill.InitialAdbRead()
+    assert 'device_time' not in drill.REPORT
+    assert drill.REPORT['local_time']
+
+
+def test_decoding_parallel(tmp_path):
+    os.environ['HOME'] = str(tmp_path)
+    src_dir = os.path.join(os.path.dirname(__file__), 'data')
+    results = []
+    for jobs in [1, 2]:
+        drill = driller.ChainExecution(str(tmp_path / f'jobs{jobs}'), src_dir=src_dir, jobs=jobs)
+        drill.CreateWorkDir()
+        drill.ExtractFromDir()
+        drill.DOWNLOADS = [*drill.DOWNLOADS, 'i_do_not_exist.db', *drill.DOWNLOADS]
+        drill.DataDecoding()
+        drill.GenerateXlsxReport()
+        drill.CleanUp()
+        results.append(drill.DECODED)
+    assert len(results[0]) == 2
+    assert results[0] == results[1]
+
+
+def concurrency_probe(peak):
+    lock = threading.Lock()
+    active = [0]
+
+    def decode(*args, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+    return decode
+
+
+def test_submit_decoding_scheduler(tmp_path):
+    scheduler = sessions.Scheduler(decoders=1)
+    drills = [driller.ChainExecution(str(tmp_path / n), scheduler=scheduler) for n in 'ab']
+    for drill in drills:
+        drill.output_dir = drill.work_dir = str(tmp_path)
+    peak = [0]
+    with mock.patch.object(driller, 'decode_target', side_effect=concurrency_probe(peak)):
+        futures = [drill.submit_decoding(f'{n}.db', object) for n in range(3) for drill in drills]
+        [f.result() for f in futures]
+        [drill.close_decode_pool() for drill in drills]
+    assert peak[0] == 1
+
+
+def thread_pool(max_workers, mp_context=None):
+    return concurrent.futures.ThreadPoolExecutor(max_workers)
+
+
+def test_decode_parallel_scheduler(tmp_path):
+    scheduler = sessions.Scheduler(decoders=1)
+    drills = [driller.ChainExecution(str(tmp_path / n), scheduler=scheduler, jobs=2) for n in 'ab']
+    for drill in drills:
+        drill.output_dir = drill.work_dir = str(tmp_path)
+    peak = [0]
+    jobs = [(f'{n}.db', type('Deco', (), {'title': 'Deco'})) for n in range(3)]
+    with mock.patch.object(driller, 'decode_target', side_effect=concurrency_probe(peak)), \
+            mock.patch.object(concurrent.futures, 'ProcessPoolExecutor', thread_pool):
+        threads = [threading.Thread(target=drill.decode_parallel, args=(jobs, None)) for drill in drills]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+    assert peak[0] == 1
+    assert all(drill.decode_pool is drill.process_pool is None for drill in drills)
+
+
+def test_decode_pool_spawned(tmp_path):
+    drill = driller.ChainExecution(str(tmp_path), jobs=2)
+    with mock.patch.object(concurrent.futures, 'ProcessPoolExecutor') as pool:
+        drill.get_decode_pool()
+    drill.decode_pool.shutdown()
+    assert pool.call_args[1]['mp_context'].get_start_method() == 'spawn'
+
+
+def test_create_work_dir_parallel(tmp_path):
+    drills = [driller.ChainExecution(str(tmp_path)) for _ in range(8)]
+    barrier = threading.Barrier(len(drills))
+
+    def create(drill):
+        barrier.wait()
+        drill.CreateWorkDir()
+
+    with mock.patch.object(driller.time, 'strftime', return_value='2020-01-01'):
+        threads = [threading.Thread(target=create, args=(drill,)) for drill in drills]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+    work_dirs = {drill.work_dir for drill in drills}
+    assert len(work_dirs) == len(drills)
+    assert all(os.path.isdir(drill.output_dir) for drill in drills)
+    [drill.DataStore.close() for drill in drills]
+
+
+def test_cleanup_keeps_source_tar(tmp_path):
+    source = tmp_path / 'source.tar'
+    source.write_bytes(b'')
+    drill = driller.ChainExecution(str(tmp_path / 'out'), tarfile=str(source))
+    drill.CreateWorkDir()
+    drill.CleanUp()
+    assert source.exists()
+
+    converted = tmp_path / 'backup.ab.tar'
+    converted.write_bytes(b'')
+    drill = driller.ChainExecution(str(tmp_path / 'out'), backup=str(tmp_path / 'backup.ab'))
+    drill.tools = mock.Mock()
+    drill.tools.ab_to_tar.return_value = str(converted)
+    drill.CreateWorkDir()
+    drill.AndroidBackupToTar()
+    drill.CleanUp()
+    assert not converted.exists()
+
+
+def test_acquire_pipelined(tmp_path):
+    drill = driller.ChainExecution(str(tmp_path))
+    events = []
+    A, B, C = (type(n, (), {}) for n in "ABC")
+    drill.registry = mock.Mock()
+    drill.registry.get_root_link_groups.return_value = {
+        A: ['/x/a.db', '/x/a.db-wal', '/x/shared.xml'],
+        B: ['/y/b.db', '/x/shared.xml'],
+        C: ['/z/a.db'],
+    }
+    drill.registry.decoders_target.side_effect = lambda name: [A, C] if name == 'a.db' else [B]
+
+    def download_file(file_path):
+        events.append(file_path)
+        if not file_path.endswith('-wal'):
+            drill.DOWNLOADS.append(os.path.basename(file_path))
+
+    with mock.patch.object(drill, 'download_file', side_effect=download_file), \
+            mock.patch.object(drill, 'submit_decoding', side_effect=lambda *a: events.append(a)):
+        drill.acquire_pipelined()
+    # a.db is shared by two groups, so it is left to DataDecoding
+    assert events == ['/x/a.db', '/x/a.db-wal', '/x/shared.xml', '/y/b.db', ('b.db', B), '/z/a.db']
+
+
+def test_extract_from_dir_layout(tmp_path):
+    src = tmp_path / 'src'
+    files = [
+        'user/0/com.android.providers.settings/databases/settings.db',
+        'user/10/com.android.providers.settings/databases/settings.db',
+        'user/0/com.example.unknown/databases/settings.db',
+        'user/0/com.whatsapp/databases/notes.txt',
+    ]
+    for name in files:
+        (src / name).parent.mkdir(parents=True, exist_ok=True)
+        (src / name).write_bytes(b'x')
+    for link in [False, True]:
+        drill = driller.ChainExecution(str(tmp_path / f'out{link}'), src_dir=str(src), link_files=link)
+        drill.CreateWorkDir()
+        drill.ExtractFromDir()
+        assert drill.DOWNLOADS == files[:2]
+        copied = os.path.join(drill.output_dir, files[1])
+        assert os.path.isfile(copied)
+        assert os.path.samefile(copied, src / files[1]) is link
+
+
+def test_extract_from_dir_dotted_folders(tmp_path):
+    src = tmp_path / 'src'
+    files = [
+        'case.2021/data/data/com.android.providers.contacts/databases/calllog.db',
+        'case.2021/data/data/com.example.unknown/databases/calllog.db',
+        'plain/data/data/com.android.providers.contacts/databases/calllog.db',
+    ]
+    for name in files:
+        (src / name).parent.mkdir(parents=True, exist_ok=True)
+        (src / name).write_bytes(b'x')
+    drill = driller.ChainExecution(str(tmp_path / 'out'), src_dir=str(src))
+    drill.CreateWorkDir()
+    drill.ExtractFromDir()
+    assert drill.DOWNLOADS == [files[0], files[2]]
+    assert drill.registry.is_foreign_package(str(src / 'case.2021' / 'data' / 'data' / 'com.example.unknown'))
+    assert not drill.registry.is_foreign_package(str(src / 'case.2021'))
+
+
+def test_content_data_store(tmp_path):
+    src = tmp_path / 'src.db'
+    src.write_bytes(b'x')
+    drill = driller.ChainExecution(str(tmp_path / 'out'), data_store='cas')
+    drill.CreateWorkDir()
+    local = os.path.join(drill.output_dir, 'src.db')
+    os.link(src, local)
+    drill.DataStore.add(local, '/data/data/src.db')
+    drill.CleanUp()
+    store_dir = os.path.join(drill.work_dir, 'DataStore')
+    assert sorted(os.listdir(store_dir)) == ['index.json', 'index.json.md5', 'objects']
+    assert 'DataStore.tar' not in os.listdir(drill.work_dir)
+
+
+def test_decode_users(tmp_path):
+    src_dir = tmp_path / 'src'
+    data_dir = os.path.join(os.path.dirname(__file__), 'data', 'data')
+    shutil.copytree(data_dir, str(src_dir / 'data'))
+    shutil.copytree(data_dir, str(src_dir / 'user' / '10'))
+    drill = driller.ChainExecution(str(tmp_path / 'out'), src_dir=str(src_dir))
+    drill.CreateWorkDir()
+    drill.ExtractFromDir()
+    drill.DataDecoding()
+    drill.GenerateXlsxReport()
+    reports = {report for report, _ in drill.DECODED}
+    assert len(reports) == len(drill.DECODED) == 2
+    assert all(os.path.isfile(os.path.join(drill.work_dir, report)) for report in reports)
+    assert os.path.isfile(os.path.join(drill.work_dir, 'REPORT.xlsx'))
+    drill.DataStore.close()
@@ -0,0 +1,15 @@
+import os
+from andriller import engines
+
+
+def test_engine_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    engines.get_engine.cache_clear()
+    try:
+        env = engines.get_engine()
+        assert engines.get_engine() is env
+        env.get_template('base.html')
+        assert os.listdir(tmp_path / 'cache' / 'andriller' / 'templates')
+    finally:
+        engines.get_engine.cache_clear()
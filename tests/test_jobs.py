@@ -0,0 +1,67 @@
+import os
+import json
+import argparse
+import pytest
+from andriller import jobs
+
+
+def parse(*argv):
+    parser = argparse.ArgumentParser()
+    jobs.add_parser(parser.add_subparsers(dest='command'))
+    return parser.parse_args(argv)
+
+
+def test_parser_requires_action():
+    assert parse('jobs', 'status').action == 'status'
+    with pytest.raises(SystemExit):
+        parse('jobs')
+
+
+def test_queue_retry(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / 'q.sqlite'))
+    job_id = queue.add('tar', 'a.tar', 'out', max_attempts=2)
+    assert queue.add('tar', 'a.tar', 'out') is None
+    job = queue.claim(worker=1)
+    assert job['id'] == job_id and job['status'] == 'running' and job['attempts'] == 1
+    assert queue.claim() is None
+    queue.fail(job_id, 'boom')
+    assert queue.get(job_id)['status'] == 'queued'
+    queue.claim()
+    queue.fail(job_id, 'boom again')
+    job = queue.get(job_id)
+    assert job['status'] == 'failed' and job['error'] == 'boom again'
+    assert queue.pending() == 0
+
+
+def test_queue_recover_and_scan(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / 'q.sqlite'))
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    (inbox / 'a.ab').write_bytes(b'')
+    (inbox / 'b.tar').write_bytes(b'')
+    (inbox / 'c.txt').write_bytes(b'')
+    (inbox / 'd').mkdir()
+    assert queue.scan(str(inbox), 'out') == []  # not settled yet
+    assert len(queue.scan(str(inbox), 'out', settle=0)) == 3
+    assert queue.scan(str(inbox), 'out', settle=0) == []
+    assert [j['kind'] for j in queue.jobs()] == ['ab', 'tar', 'dir']
+    queue.claim()
+    assert queue.recover() == 1
+    assert len(queue.jobs(status='queued')) == 3
+
+
+def test_serve(tmp_path, capsys):
+    os.environ['HOME'] = str(tmp_path)
+    src_dir = os.path.join(os.path.dirname(__file__), 'data')
+    queue_path = str(tmp_path / 'q.sqlite')
+    out = str(tmp_path / 'out')
+    args = parse('jobs', '--queue', queue_path, 'add', '--dir', src_dir, '--tar', str(tmp_path / 'nope.tar'),
+        '--out', out, '--retries', '1')
+    assert jobs.main(args) == 0
+    assert jobs.main(parse('jobs', '--queue', queue_path, 'run', '--workers', '2')) == 1
+    capsys.readouterr()
+    jobs.main(parse('jobs', '--queue', queue_path, 'status'))
+    status = {j['kind']: j for j in map(json.loads, capsys.readouterr().out.splitlines())}
+    assert status['dir']['status'] == 'done'
+    assert 'REPORT.html' in os.listdir(status['dir']['work_dir'])
+    assert status['tar']['status'] == 'failed' and status['tar']['attempts'] == 2
@@ -27,3 +27,18 @@ def test_root_links(registry):
     links = registry.get_root_links()
     p = '/data/data/com.whatsapp/databases/wa.db'
     assert p in links
+
+
+@pytest.mark.parametrize('file_name,result', [
+    ('apps/com.kik.android/db/123.kikDatabase.db', True),
+    ('gphotos12.db', True),
+    ('data/com.whatsapp/databases/msgstore.db', True),
+    ('msgstore.db-wal', False),
+])
+def test_has_target(registry, file_name, result):
+    assert registry.has_target(file_name) is result
+
+
+def test_decoders_target_glob(registry):
+    assert registry.decoders_target('gphotos12.db') == [decoders.GooglePhotosDecoder]
+    assert registry.decoders_target('123.kikDatabase.db') == [decoders.KikMessagesDecoder]
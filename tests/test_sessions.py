@@ -0,0 +1,42 @@
+import time
+import threading
+from unittest import mock
+from andriller import sessions
+
+
+def test_scheduler_limits():
+    scheduler = sessions.Scheduler(transfers=2)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def transfer():
+        with scheduler.slot('transfer'):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=transfer) for _ in range(6)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert peak[0] == 2
+
+
+def test_session_run(tmp_path):
+    adb = mock.Mock()
+    adb.devices.return_value = [['AAA', 'device'], ['BBB', 'offline'], ['CCC', 'device']]
+    session = sessions.SessionManager(tmp_path, adb=adb)
+    assert session.enumerate() == ['AAA', 'CCC']
+
+    def extract(serial):
+        if serial == 'CCC':
+            raise RuntimeError('boom')
+        return f'{tmp_path}/{serial}'
+
+    with mock.patch.object(session, 'extract', side_effect=extract):
+        results = session.run()
+    assert results['AAA'] == f'{tmp_path}/AAA'
+    assert isinstance(results['CCC'], RuntimeError)
+    assert 'BBB' not in results
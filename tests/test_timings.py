@@ -0,0 +1,26 @@
+import json
+import pytest
+from andriller import timings
+
+
+def test_stage_counters(tmp_path):
+    timer = timings.Timings()
+    with timer.stage('download', file='a.db', bytes=10):
+        pass
+    with timer.stage('download', file='b.db', bytes=5) as counters:
+        counters['rows'] = 3
+    with pytest.raises(ValueError):
+        with timer.stage('boom'):
+            raise ValueError()
+    summary = timer.summary()
+    assert summary['totals']['download']['count'] == 2
+    assert summary['totals']['download']['bytes'] == 15
+    assert summary['totals']['download']['rows'] == 3
+    assert summary['totals']['boom']['count'] == 1
+
+    trace = tmp_path / 'trace.json'
+    timer.dump_trace(trace)
+    events = json.loads(trace.read_text())['traceEvents']
+    assert [e['name'] for e in events] == ['download', 'download', 'boom']
+    assert events[0]['ph'] == 'X'
+    assert events[0]['args'] == {'file': 'a.db', 'bytes': 10}
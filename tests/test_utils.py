@@ -1,5 +1,6 @@
 import pytest
 import uuid
+import tarfile
 import tempfile
 from andriller import utils
 
@@ -72,3 +73,29 @@ def test_hash_file():
         tf.seek(0)
         assert utils.hash_file(tf.name) == fmd5
         assert fmd5 in open(tf.name + '.md5').read()
+
+
+def test_target_matcher():
+    match = utils.target_matcher(['apps/a/db/x.db', 'apps/k/db/*.kik.db'])
+    assert match('apps/a/db/x.db')
+    assert match('apps/k/db/123.kik.db')
+    assert not match('apps/k/db/sub/123.kik.db')
+    assert not match('apps/a/db/x.db-wal')
+    assert not utils.target_matcher([])('x')
+
+
+def test_extract_from_tar_targets(tmp_path):
+    src = tmp_path / 'src'
+    for name in ['apps/a/db/x.db', 'apps/a/db/x.db-wal', 'apps/k/db/1.kik.db', 'apps/b/f/big.bin']:
+        (src / name).parent.mkdir(parents=True, exist_ok=True)
+        (src / name).write_bytes(b'data')
+    tar_file = tmp_path / 'backup.tar'
+    with tarfile.open(tar_file, 'w') as tar:
+        tar.add(src / 'apps', arcname='apps')
+
+    dst = tmp_path / 'dst'
+    targets = ['apps/a/db/x.db', 'apps/a/db/x.db-wal', 'apps/k/db/*.kik.db']
+    names = [*utils.DrillerTools.extract_form_tar(tar_file, dst, targets=targets)]
+    assert sorted(names) == ['apps/a/db/x.db', 'apps/a/db/x.db-wal', 'apps/k/db/1.kik.db']
+    assert not (dst / 'apps' / 'b').exists()
+    assert (dst / 'apps' / 'a' / 'db' / 'x.db').read_bytes() == b'data'
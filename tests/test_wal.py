@@ -0,0 +1,82 @@
+import os
+import shutil
+import sqlite3
+import hashlib
+import pytest
+from andriller import wal
+
+
+@pytest.fixture(autouse=True, params=[True, False], ids=['deserialize', 'snapshot'])
+def deserialize(request, monkeypatch):
+    if request.param and not hasattr(sqlite3.Connection, 'deserialize'):
+        pytest.skip('needs Python 3.11+')
+    monkeypatch.setattr(wal, 'DESERIALIZE', request.param)
+    return request.param
+
+
+def md5(path):
+    with open(path, 'rb') as R:
+        return hashlib.md5(R.read()).hexdigest()
+
+
+@pytest.fixture
+def wal_db(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    conn = sqlite3.connect(src / 'test.db')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA wal_autocheckpoint=0')
+    with conn:
+        conn.execute('CREATE TABLE t (n INTEGER, s TEXT)')
+        conn.executemany('INSERT INTO t VALUES (?, ?)', [(n, 'x' * 500) for n in range(50)])
+    with conn:
+        conn.executemany('INSERT INTO t VALUES (?, ?)', [(n, 'y') for n in range(50, 60)])
+    dst = tmp_path / 'dst'
+    dst.mkdir()
+    for name in ['test.db', 'test.db-wal']:
+        shutil.copy(src / name, dst / name)  # copied before the WAL is checkpointed on close
+    conn.close()
+    return str(dst / 'test.db')
+
+
+def test_wal_image(wal_db):
+    hashes = [md5(wal_db), md5(f'{wal_db}-wal')]
+    conn = wal.connect(wal_db)
+    assert conn.execute('SELECT count(*), max(n) FROM t').fetchone() == (60, 59)
+    assert conn.execute('PRAGMA integrity_check').fetchone() == ('ok',)
+    assert hashes == [md5(wal_db), md5(f'{wal_db}-wal')]
+    assert sorted(os.listdir(os.path.dirname(wal_db))) == ['test.db', 'test.db-wal']
+
+
+def test_wal_torn_commit(wal_db):
+    wal_file = f'{wal_db}-wal'
+    with open(wal_file, 'r+b') as W:
+        W.truncate(os.path.getsize(wal_file) - 10)
+    conn = wal.connect(wal_db)
+    assert conn.execute('SELECT count(*) FROM t').fetchone() == (50,)
+
+
+def test_wal_none(tmp_path):
+    db = tmp_path / 'plain.db'
+    with sqlite3.connect(db) as conn:
+        conn.execute('CREATE TABLE t (n INTEGER)')
+    assert wal.connect(str(db)) is None
+    (tmp_path / 'plain.db-wal').write_bytes(b'')
+    assert wal.connect(str(db)) is None
+
+
+def test_wal_matches_sqlite():
+    db = os.path.join(os.path.dirname(__file__), 'data', 'other', 'locks', 'locksettings.db')
+    uri = f'file:{os.path.abspath(db)}?mode=ro'
+    with sqlite3.connect(uri, uri=True) as conn:
+        expected = conn.execute('SELECT * FROM locksettings').fetchall()
+    assert wal.connect(db).execute('SELECT * FROM locksettings').fetchall() == expected
+
+
+def test_wal_snapshot_removed(wal_db, deserialize):
+    conn = wal.connect(wal_db)
+    path = getattr(conn, 'path', None)
+    assert bool(path) is not deserialize
+    assert conn.execute('SELECT count(*) FROM t').fetchone() == (60,)
+    conn.close()
+    assert not path or not os.path.exists(path)